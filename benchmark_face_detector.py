@@ -0,0 +1,74 @@
+# benchmark_face_detector.py
+import os
+import sys
+import time
+import cv2
+from frame_sampler import plan_frame_indices, iter_sampled_frames
+from face_detector import PRESETS, FaceDetector, match_recall
+
+print("⏱️  Face Detector Benchmark")
+print("=" * 50)
+
+VIDEO_DIR = "data/FaceForensics++_C23/original"
+
+
+def load_frames(video_dir, num_videos=10, frames_per_video=30):
+    """Decode a fixed set of frames per video so every preset sees the same input"""
+    video_files = sorted(f for f in os.listdir(video_dir) if f.endswith('.mp4'))[:num_videos]
+    videos = []
+    for video_file in video_files:
+        cap = cv2.VideoCapture(os.path.join(video_dir, video_file))
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        frame_indices = plan_frame_indices(total_frames, frames_per_video)
+        frames = [frame for _, frame in iter_sampled_frames(cap, frame_indices)]
+        cap.release()
+        if frames:
+            videos.append(frames)
+    return videos
+
+
+def run_preset(preset, videos):
+    detector = FaceDetector(preset)
+    results = []
+    for frames in videos:
+        detector.reset()
+        results.append(detector.detect_batch(frames))
+    return detector.stats(), results
+
+
+def main():
+    video_dir = sys.argv[1] if len(sys.argv) > 1 else VIDEO_DIR
+    if not os.path.exists(video_dir):
+        print(f"❌ Directory not found: {video_dir}")
+        return
+
+    print(f"🎬 Loading frames from {video_dir}...")
+    start = time.time()
+    videos = load_frames(video_dir)
+    num_frames = sum(len(frames) for frames in videos)
+    print(f"   {len(videos)} videos, {num_frames} frames ({time.time() - start:.1f}s)\n")
+    if num_frames == 0:
+        return
+
+    # Full-resolution "accurate" detection is the reference for recall
+    reference_stats, reference = run_preset("accurate", videos)
+    reference_boxes = sum(len(faces) for frames in reference for faces in frames)
+
+    print(f"{'preset':>10} {'frames/s':>9} {'det/s':>9} {'cascade':>8} {'skipped':>8} {'recall':>7} {'speedup':>8}")
+    for preset in PRESETS:
+        stats, results = (reference_stats, reference) if preset == "accurate" else run_preset(preset, videos)
+        matched = sum(
+            match_recall(ref_faces, faces)
+            for ref_frames, frames in zip(reference, results)
+            for ref_faces, faces in zip(ref_frames, frames)
+        )
+        recall = matched / reference_boxes if reference_boxes else 1.0
+        speedup = stats["frames_per_sec"] / reference_stats["frames_per_sec"] if reference_stats["frames_per_sec"] else 0.0
+        print(f"{preset:>10} {stats['frames_per_sec']:>9.1f} {stats['detections_per_sec']:>9.1f} "
+              f"{stats['cascade_calls']:>8} {stats['skipped']:>8} {recall:>7.3f} {speedup:>7.2f}x")
+
+    print(f"\n📊 Reference boxes (accurate, full resolution): {reference_boxes}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,13 @@
 # create_manifest.py
 import os
-import random
-from tqdm import tqdm
+import time
+import argparse
+import numpy as np
+from manifest_store import MANIFEST_SUFFIX, scan_videos, save_manifest
+from split_engine import DEFAULT_RATIOS, assign_splits, split_stats
+from run_config import RUN_CONFIG_SUFFIX, RunConfig, add_run_arguments
+
+RUN_CONFIG_PATH = f"manifests/manifest{RUN_CONFIG_SUFFIX}"
 
 # -- Configuration for YOUR dataset structure --
 DATA_DIR = "data/FaceForensics++_C23"
@@ -19,17 +25,19 @@ FAKE_VIDEO_DIRS = [
     os.path.join(DATA_DIR, "DeepFakeDetection"),
 ]
 
-def create_manifest():
+def create_manifest(workers=8, probe=True, ratios=None, seed=0, stratify=True):
     print("🎬 Creating Dataset Manifest for Your Dataset Structure")
     print("=" * 60)
     
+    # Scan order and thread count never affect the result, only these do
+    run = RunConfig("manifest", seed, ratios=dict(ratios or DEFAULT_RATIOS), stratify=stratify, probe=probe)
+    
     # Check if directories exist
     print("🔍 Checking dataset directories...")
     all_dirs_exist = True
     for dir_path in [ORIGINAL_VID_DIR] + FAKE_VIDEO_DIRS:
         if os.path.exists(dir_path):
-            file_count = len([f for f in os.listdir(dir_path) if f.endswith('.mp4')])
-            print(f"✅ {os.path.basename(dir_path)}: {file_count} videos")
+            print(f"✅ {os.path.basename(dir_path)}")
         else:
             print(f"❌ {os.path.basename(dir_path)}: NOT FOUND")
             all_dirs_exist = False
@@ -38,81 +46,79 @@ def create_manifest():
         print("\n❌ Some directories are missing. Please check your dataset structure.")
         return
     
-    print("\n📊 Collecting video files...")
-    
-    # Get all original video files (REAL videos)
-    original_videos = [f for f in os.listdir(ORIGINAL_VID_DIR) if f.endswith('.mp4')]
-    original_ids = [f.split('.')[0] for f in original_videos]
-    
-    print(f"📹 Found {len(original_videos)} original (REAL) videos")
+    print(f"\n📊 Scanning video files ({workers} threads{', probing frame counts' if probe else ''})...")
+    start_time = time.time()
     
-    # Shuffle for train/test split (80% train, 20% test)
-    random.shuffle(original_ids)
-    split_idx = int(0.8 * len(original_ids))
-    train_ids = set(original_ids[:split_idx])
-    test_ids = set(original_ids[split_idx:])
+    # One scandir pass per directory, all directories at once (REAL = 0, FAKE = 1)
+    sources = [(ORIGINAL_VID_DIR, 0)] + [(fake_dir, 1) for fake_dir in FAKE_VIDEO_DIRS]
+    videos = scan_videos(sources, workers=workers, probe=probe)
+    print(f"⏱️  Scanned {len(videos)} videos in {time.time() - start_time:.1f}s")
     
-    print(f"🎯 Split: {len(train_ids)} train, {len(test_ids)} test")
+    is_real = videos['label'] == 0
+    for method in np.unique(videos['method']):
+        count = int((videos['method'] == method).sum())
+        print(f"📹 {method.decode()}: {count} videos")
     
-    manifests = {'train': [], 'test': []}
+    # Group-aware split: a fake goes wherever the originals it was made from go
+    ratios = run.params['ratios']
+    split_of_row = assign_splits(videos, ratios, seed=run.seed_for('split'), stratify=stratify)
+    manifests = {split: videos[split_of_row == split] for split in ratios if ratios[split] > 0}
+    stats = split_stats(videos, split_of_row)
     
-    # Process original videos (REAL = label 0)
-    print("\n🔵 Processing REAL videos...")
-    for video_file in tqdm(original_videos):
-        video_id = video_file.split('.')[0]
-        video_path = os.path.join(ORIGINAL_VID_DIR, video_file)
-        
-        split = 'train' if video_id in train_ids else 'test'
-        manifests[split].append((video_path, 0))  # 0 = real
-    
-    # Process fake videos (FAKE = label 1)
-    fake_count = 0
-    for fake_dir in FAKE_VIDEO_DIRS:
-        fake_type = os.path.basename(fake_dir)
-        print(f"\n🔴 Processing {fake_type} fake videos...")
-        
-        if os.path.exists(fake_dir):
-            fake_videos = [f for f in os.listdir(fake_dir) if f.endswith('.mp4')]
-            for video_file in tqdm(fake_videos):
-                video_id = video_file.split('.')[0]
-                video_path = os.path.join(fake_dir, video_file)
-                
-                # For fake videos, use the same split as their corresponding original
-                split = 'train' if video_id in train_ids else 'test'
-                manifests[split].append((video_path, 1))  # 1 = fake
-                fake_count += 1
+    print(f"🎯 Split {', '.join(f'{name}={ratio:g}' for name, ratio in ratios.items())} "
+          f"(seed {seed}{', stratified by method' if stratify else ''})")
     
     print(f"\n📈 Final Dataset Statistics:")
-    print(f"   Real videos: {len(original_videos)}")
-    print(f"   Fake videos: {fake_count}")
-    print(f"   Total videos: {len(original_videos) + fake_count}")
-    print(f"   Train set: {len(manifests['train'])} videos")
-    print(f"   Test set: {len(manifests['test'])} videos")
+    print(f"   Real videos: {int(is_real.sum())}")
+    print(f"   Fake videos: {int((~is_real).sum())}")
+    print(f"   Total videos: {len(videos)}")
+    for split, rows in manifests.items():
+        print(f"   {split.capitalize()} set: {len(rows)} videos")
+    if probe:
+        probed = videos[videos['frames'] >= 0]
+        print(f"   Duration: {probed['duration'].sum() / 3600:.1f} hours, {int(probed['frames'].sum())} frames")
     
     # Calculate balance
-    train_real = sum(1 for _, label in manifests['train'] if label == 0)
-    train_fake = sum(1 for _, label in manifests['train'] if label == 1)
-    test_real = sum(1 for _, label in manifests['test'] if label == 0)
-    test_fake = sum(1 for _, label in manifests['test'] if label == 1)
-    
     print(f"\n⚖️  Dataset Balance:")
-    print(f"   Train - Real: {train_real}, Fake: {train_fake}")
-    print(f"   Test  - Real: {test_real}, Fake: {test_fake}")
-    
-    # Save manifests
-    os.makedirs('manifests', exist_ok=True)
-    
-    for split in ['train', 'test']:
-        manifest_file = f'manifests/{split}_manifest.csv'
-        with open(manifest_file, 'w') as f:
-            for path, label in manifests[split]:
-                f.write(f'{path},{label}\n')
-        
+    for split in manifests:
+        entry = stats['splits'][split]
+        print(f"   {split.capitalize():<5} - Real: {entry['real']}, Fake: {entry['fake']}")
+        print("           " + ", ".join(f"{method}: {count}" for method, count in sorted(entry['methods'].items())))
+    if stats['leaked_identities']:
+        print(f"⚠️  {len(stats['leaked_identities'])} identities appear in more than one split")
+    else:
+        print(f"🔒 {stats['identities']} identities, none shared between splits")
+    for group in stats['oversized_groups'][:5]:
+        shares = ", ".join(f"{method} {share:.0%}" for method, share in sorted(group['method_shares'].items()))
+        print(f"⚠️  Identity group {group['group']} holds {group['videos']} videos ({shares}), "
+              f"all in one split")
+    
+    # Save manifests (memory-mapped by the loaders, see manifest_store.py)
+    for split in manifests:
+        manifest_file = f'manifests/{split}_manifest{MANIFEST_SUFFIX}'
+        save_manifest(manifests[split], manifest_file)
         print(f"💾 Saved {len(manifests[split])} entries to {manifest_file}")
+    print(f"🎲 Run config: {run.save(RUN_CONFIG_PATH)}")
     
     print("\n✅ Manifest creation completed!")
     print("\n🎯 Next step: Run python extract_faces.py")
 
 if __name__ == "__main__":
-    create_manifest()
-    
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Scan FaceForensics++ and write train/test manifests")
+    parser.add_argument("--workers", type=int, default=8, help="threads for scanning and probing")
+    parser.add_argument("--no-probe", action="store_true",
+                        help="skip reading frame count and fps from every video")
+    parser.add_argument("--train", type=float, default=DEFAULT_RATIOS["train"], help="train share")
+    parser.add_argument("--val", type=float, default=0.0, help="validation share (0 = no val manifest)")
+    parser.add_argument("--test", type=float, default=DEFAULT_RATIOS["test"], help="test share")
+    parser.add_argument("--no-stratify", action="store_true",
+                        help="balance only total video counts, not every manipulation method")
+    add_run_arguments(parser)
+    args = parser.parse_args()
+    if args.replay:
+        run = RunConfig.load(args.replay, "manifest")
+        create_manifest(workers=args.workers, seed=run.seed, **run.params)
+    else:
+        create_manifest(workers=args.workers, probe=not args.no_probe,
+                        ratios={"train": args.train, "val": args.val, "test": args.test},
+                        seed=args.seed, stratify=not args.no_stratify)
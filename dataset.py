@@ -2,11 +2,14 @@ import os
 import torch
 from torch.utils.data import Dataset
 from torchvision.io import read_image
+from fast_decode import decode_face
 
 class DeepfakeDataset(Dataset):
-    def __init__(self, data_dir, split, transform=None):
+    def __init__(self, data_dir, split, transform=None, uint8=False):
         self.data_dir = os.path.join(data_dir, split)
         self.transform = transform
+        # uint8=True skips the float copy; normalize batches with fast_decode.normalize_batch
+        self.uint8 = uint8
         self.image_files = []
 
         # Load real images (label 0)
@@ -28,7 +31,10 @@ class DeepfakeDataset(Dataset):
 
     def __getitem__(self, idx):
         img_path, label = self.image_files[idx]
-        image = read_image(img_path) / 255.0 # Read and scale to [0, 1]
+        if self.uint8:
+            image = decode_face(img_path)
+        else:
+            image = read_image(img_path) / 255.0 # Read and scale to [0, 1]
 
         if self.transform:
             image = self.transform(image)
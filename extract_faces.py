@@ -1,17 +1,53 @@
 # extract_faces_simple.py
 import os
+import re
+import time
+import argparse
+from multiprocessing import Pool
 import cv2
 from tqdm import tqdm
 import numpy as np
+from frame_sampler import plan_frame_indices, iter_sampled_frames
+from face_detector import PRESETS, FaceDetector, crop_face
+from face_shards import ENCODINGS, ShardWriter, drop_videos
+from extraction_ledger import ExtractionLedger
+from run_config import RUN_CONFIG_SUFFIX, RunConfig, add_run_arguments
 
-print("🎭 Starting Face Extraction with OpenCV")
-print("=" * 50)
+# Load OpenCV's face detector ("accurate" = full-resolution Haar cascade)
+face_detector = FaceDetector("accurate")
 
-# Load OpenCV's face detector
-face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+# Open shard writers of this process, one per output directory
+_shard_writers = {}
 
-def extract_faces_from_video(video_path, output_dir, frames_per_video=5):
-    """Extract faces from a video file using OpenCV"""
+# Crop files written by extract_faces_from_video ("000_003_frame0042_face0.jpg")
+FACE_FILE_PATTERN = re.compile(r'^(?P<video>.+)_frame\d+_face\d+\.jpg$')
+
+def get_shard_writer(output_dir, encoding="jpeg"):
+    """Shard writer for this process, named after the pid so workers never share files"""
+    writer = _shard_writers.get(output_dir)
+    if writer is None:
+        writer = ShardWriter(output_dir, prefix=f"shard-{os.getpid()}", encoding=encoding)
+        _shard_writers[output_dir] = writer
+    return writer
+
+def drop_face_files(output_dir, video_names):
+    """Delete every crop file of video_names from output_dir; returns the number removed"""
+    removed = 0
+    if not video_names or not os.path.isdir(output_dir):
+        return removed
+    with os.scandir(output_dir) as entries:
+        for entry in entries:
+            match = FACE_FILE_PATTERN.match(entry.name)
+            if match and match.group('video') in video_names:
+                os.remove(entry.path)
+                removed += 1
+    return removed
+
+def extract_faces_from_video(video_path, output_dir, frames_per_video=5, shard_writer=None, label=0):
+    """Extract faces from a video file using OpenCV
+
+    Crops are saved as one JPEG each, or appended to shard_writer when given.
+    """
     os.makedirs(output_dir, exist_ok=True)
     
     try:
@@ -28,40 +64,29 @@ def extract_faces_from_video(video_path, output_dir, frames_per_video=5):
             print(f"❌ Empty video: {video_path}")
             return 0
         
-        # Calculate frame interval
-        frame_interval = max(1, total_frames // frames_per_video)
+        # Plan the sampled frames up front so the sampler can decode forward
+        frame_indices = plan_frame_indices(total_frames, frames_per_video)
         faces_extracted = 0
         
         video_name = os.path.splitext(os.path.basename(video_path))[0]
+        method = os.path.basename(os.path.dirname(video_path))
+        face_detector.reset()
         
-        for frame_idx in range(0, total_frames, frame_interval):
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-            ret, frame = cap.read()
-            
-            if not ret:
-                continue
-            
-            # Convert to grayscale for face detection
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            
-            # Detect faces
-            faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+        for frame_idx, frame in iter_sampled_frames(cap, frame_indices):
+            # Detect faces (boxes come back in full-resolution coordinates)
+            faces = face_detector.detect(frame)
             
             for i, (x, y, w, h) in enumerate(faces):
-                # Add padding
-                padding = 20
-                x1 = max(0, x - padding)
-                y1 = max(0, y - padding)
-                x2 = min(frame.shape[1], x + w + padding)
-                y2 = min(frame.shape[0], y + h + padding)
-                
-                face_img = frame[y1:y2, x1:x2]
+                # Add padding and resize to standard size
+                face_img = crop_face(frame, (x, y, w, h))
                 
-                if face_img.size == 0:
+                if face_img is None:
                     continue
                 
-                # Resize to standard size
-                face_img = cv2.resize(face_img, (224, 224))
+                if shard_writer is not None:
+                    if shard_writer.add(face_img, video_name, method, frame_idx, i, (x, y, w, h), label):
+                        faces_extracted += 1
+                    continue
                 
                 # Save face image
                 output_path = os.path.join(
@@ -79,17 +104,68 @@ def extract_faces_from_video(video_path, output_dir, frames_per_video=5):
                 break
         
         cap.release()
+        if shard_writer is not None:
+            # One batched write per video keeps shards consistent if we crash
+            shard_writer.flush()
         return faces_extracted
         
     except Exception as e:
         print(f"❌ Error processing {video_path}: {e}")
+        if shard_writer is not None:
+            # The ledger does not record this video, so none of its crops may reach the shards
+            shard_writer.discard()
         return 0
 
-def main():
+def _init_worker(detector_preset, seed=0):
+    """Give each pool worker its own detector, a single OpenCV thread and a seeded OpenCV RNG"""
+    global face_detector
+    cv2.setNumThreads(1)
+    cv2.setRNGSeed(seed)
+    face_detector = FaceDetector(detector_preset)
+
+def _extract_job(job):
+    """Pool entry point: (label, video_path, output_dir, frames, shard_encoding, ledger, params) -> (label, faces)"""
+    label, video_path, output_dir, frames_per_video, shard_encoding, ledger, params = job
+    start = time.time()
+    shard_writer = get_shard_writer(output_dir, shard_encoding) if shard_encoding else None
+    faces = extract_faces_from_video(video_path, output_dir, frames_per_video=frames_per_video,
+                                     shard_writer=shard_writer, label=0 if label == "real" else 1)
+    # Zero faces may mean the video failed to open, so only record videos that produced crops
+    if ledger is not None and faces > 0:
+        ledger.record(video_path, params, output_dir, faces, time.time() - start)
+    return label, faces
+
+def main(num_workers=1, detector_preset="accurate", output_format="files", shard_encoding="jpeg", force=False,
+         frames_per_video=3, seed=0):
+    """Extract every configured video; settings and seed are saved to extracted_faces/extraction.run.json
+
+    Crops are identical across runs with the same settings. With several
+    workers, the order of records inside shards follows completion order.
+    """
+    global face_detector
+    run = RunConfig("extraction", seed, frames_per_video=frames_per_video, detector_preset=detector_preset,
+                    output_format=output_format, shard_encoding=shard_encoding)
+    run.seed_globals()
+    print("🎭 Starting Face Extraction with OpenCV")
+    print("=" * 50)
+    print(f"🔎 Detector preset: {detector_preset}")
+    print(f"💾 Output format: {output_format}" + (f" ({shard_encoding})" if output_format == "shards" else ""))
+    
     # Create output directory
     output_base = "extracted_faces"
     os.makedirs(output_base, exist_ok=True)
     
+    # Videos finished by earlier runs with the same settings are skipped unless forced
+    ledger = ExtractionLedger(os.path.join(output_base, "extraction_ledger.sqlite"))
+    params = {
+        "frames_per_video": frames_per_video,
+        "detector_preset": detector_preset,
+        "output_format": output_format,
+        "shard_encoding": shard_encoding if output_format == "shards" else None,
+    }
+    done_videos = set() if force else ledger.done_videos(params)
+    print(f"📒 Ledger: {ledger.path} ({'--force, redoing every video' if force else f'{len(done_videos)} videos already done'})")
+    
     # Define dataset structure - process only REAL and one FAKE type for testing
     dataset_dirs = {
         "real": "data/FaceForensics++_C23/original",
@@ -102,14 +178,15 @@ def main():
         # "fake_DeepFakeDetection": "data/FaceForensics++_C23/DeepFakeDetection",
     }
     
-    total_faces = 0
-    
+    # Collect one job per video across all categories
+    jobs = []
+    skipped = 0
     for label, video_dir in dataset_dirs.items():
         if not os.path.exists(video_dir):
             print(f"❌ Directory not found: {video_dir}")
             continue
         
-        print(f"\n🔍 Processing {label} videos from: {video_dir}")
+        print(f"\n🔍 Collecting {label} videos from: {video_dir}")
         
         # Get all video files
         video_files = [f for f in os.listdir(video_dir) if f.endswith('.mp4')]
@@ -130,18 +207,90 @@ def main():
             video_files = video_files[:5]
             print(f"   TEST MODE: Processing first {len(video_files)} videos")
         
-        faces_from_category = 0
-        for video_file in tqdm(video_files, desc=f"Extracting {label}"):
+        for video_file in video_files:
             video_path = os.path.join(video_dir, video_file)
-            faces_extracted = extract_faces_from_video(video_path, output_dir, frames_per_video=3)
-            faces_from_category += faces_extracted
-        
-        total_faces += faces_from_category
+            if video_path in done_videos:
+                skipped += 1
+                continue
+            jobs.append((label, video_path, output_dir, frames_per_video,
+                         shard_encoding if output_format == "shards" else None, ledger, params))
+    
+    if skipped:
+        print(f"\n⏭️  Skipping {skipped} videos already in the ledger (use --force to redo them)")
+    
+    # Drop earlier (forced, changed or partial) crops of every video to redo, a run with fewer
+    # faces or frames per video would otherwise leave the old ones next to the new ones
+    videos_by_dir = {}
+    for _, video_path, output_dir, *_ in jobs:
+        video_name = os.path.splitext(os.path.basename(video_path))[0]
+        method = os.path.basename(os.path.dirname(video_path))
+        videos_by_dir.setdefault(output_dir, []).append((method, video_name))
+    if output_format == "shards":
+        dropped = sum(drop_videos(output_dir, keys) for output_dir, keys in videos_by_dir.items())
+        if dropped:
+            print(f"🗑️  Dropped {dropped} earlier shard records of videos being extracted again")
+    else:
+        removed = sum(drop_face_files(output_dir, {video_name for _, video_name in keys})
+                      for output_dir, keys in videos_by_dir.items())
+        if removed:
+            print(f"🗑️  Removed {removed} earlier face crops of videos being extracted again")
+    
+    faces_per_category = {label: 0 for label in dataset_dirs}
+    start_time = time.time()
+    
+    if num_workers > 1:
+        print(f"\n⚙️  Extracting {len(jobs)} videos with {num_workers} worker processes")
+        worker_seed = run.seed_for("opencv") % 2**31
+        with Pool(num_workers, initializer=_init_worker, initargs=(detector_preset, worker_seed)) as pool:
+            # Videos are large units of work, so hand them out one at a time
+            results = pool.imap_unordered(_extract_job, jobs, chunksize=1)
+            for label, faces_extracted in tqdm(results, total=len(jobs), desc="Extracting"):
+                faces_per_category[label] += faces_extracted
+    else:
+        cv2.setRNGSeed(run.seed_for("opencv") % 2**31)
+        if face_detector.preset != detector_preset:
+            face_detector = FaceDetector(detector_preset)
+        for job in tqdm(jobs, desc="Extracting"):
+            label, faces_extracted = _extract_job(job)
+            faces_per_category[label] += faces_extracted
+        stats = face_detector.stats()
+        print(f"🔎 {stats['frames']} frames, {stats['skipped']} reused tracked boxes, "
+              f"{stats['frames_per_sec']:.1f} detections/sec")
+    
+    elapsed = time.time() - start_time
+    
+    for label, faces_from_category in faces_per_category.items():
         print(f"   ✅ Extracted {faces_from_category} faces from {label}")
+    total_faces = sum(faces_per_category.values())
     
     print(f"\n🎉 Face extraction completed!")
     print(f"📊 Total faces extracted: {total_faces}")
+    if elapsed > 0:
+        print(f"⏱️  {len(jobs)} videos in {elapsed:.1f}s ({len(jobs) / elapsed:.2f} videos/sec)")
+    summary = ledger.summary()
+    print(f"📒 Ledger now covers {summary['videos']} videos, {summary['faces']} faces")
+    print(f"🎲 Run config: {run.save(os.path.join(output_base, 'extraction' + RUN_CONFIG_SUFFIX))}")
     print(f"📁 Output directory: {output_base}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Extract face crops from FaceForensics++ videos")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of extraction processes (default: 1, sequential)")
+    parser.add_argument("--detector-preset", choices=list(PRESETS), default="accurate",
+                        help="face detection speed/recall trade-off (default: accurate)")
+    parser.add_argument("--output-format", choices=["files", "shards"], default="files",
+                        help="one JPEG per face, or packed shard files with an index (default: files)")
+    parser.add_argument("--shard-encoding", choices=list(ENCODINGS), default="jpeg",
+                        help="how crops are stored inside shards (default: jpeg)")
+    parser.add_argument("--force", action="store_true",
+                        help="ignore the ledger and extract every video again (by default videos the "
+                             "ledger marks as done with the same settings are skipped)")
+    add_run_arguments(parser)
+    args = parser.parse_args()
+    if args.replay:
+        run = RunConfig.load(args.replay, "extraction")
+        main(num_workers=max(1, args.workers), force=args.force, seed=run.seed, **run.params)
+    else:
+        main(num_workers=max(1, args.workers), detector_preset=args.detector_preset,
+             output_format=args.output_format, shard_encoding=args.shard_encoding, force=args.force,
+             seed=args.seed)
@@ -2,6 +2,7 @@
 import os
 import cv2
 from tqdm import tqdm
+from frame_sampler import plan_frame_indices, iter_sampled_frames
 
 print("🎭 Simple Face Extraction")
 print("=" * 40)
@@ -26,13 +27,8 @@ def extract_faces_simple(video_path, output_dir, max_faces=3):
         faces_found = 0
         
         # Sample frames throughout the video
-        for frame_idx in range(0, total_frames, total_frames // max_faces):
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-            ret, frame = cap.read()
-            
-            if not ret:
-                continue
-            
+        frame_indices = plan_frame_indices(total_frames, max_faces)
+        for frame_idx, frame in iter_sampled_frames(cap, frame_indices):
             # Detect faces
             gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
             faces = face_cascade.detectMultiScale(gray, 1.1, 5)
@@ -0,0 +1,92 @@
+# extraction_ledger.py
+import os
+import json
+import time
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    params TEXT NOT NULL,       -- JSON of the sampling/output parameters
+    output_dir TEXT NOT NULL,
+    faces INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    finished REAL NOT NULL
+);
+"""
+
+
+def params_key(params):
+    """Canonical string of a parameter dict, so key order never matters"""
+    return json.dumps(params, sort_keys=True)
+
+
+class ExtractionLedger:
+    """Durable record of which videos have been extracted, and with what settings
+
+    A video counts as done when its path, size, mtime and parameters all match
+    a row. Rows are written with one autocommit statement after the video's
+    crops are on disk, so a crash mid-video leaves no row and the video is
+    simply redone. SQLite in WAL mode lets every worker process write its own
+    rows concurrently.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._local = threading.local()
+        self._db()  # create the schema up front
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _db(self):
+        """SQLite connection of the calling thread (and process)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def done_videos(self, params):
+        """Paths whose recorded size, mtime and parameters still match the file on disk"""
+        key = params_key(params)
+        done = set()
+        for video_path, size, mtime_ns, row_params in self._db().execute(
+                'SELECT video_path, size, mtime_ns, params FROM videos'):
+            if row_params != key:
+                continue
+            try:
+                stat = os.stat(video_path)
+            except OSError:
+                continue
+            if stat.st_size == size and stat.st_mtime_ns == mtime_ns:
+                done.add(video_path)
+        return done
+
+    def record(self, video_path, params, output_dir, faces, seconds):
+        """Mark one video as finished (replaces any older row for the path)"""
+        stat = os.stat(video_path)
+        self._db().execute(
+            'INSERT OR REPLACE INTO videos '
+            '(video_path, size, mtime_ns, params, output_dir, faces, seconds, finished) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (video_path, stat.st_size, stat.st_mtime_ns, params_key(params), output_dir, faces, seconds,
+             time.time()))
+
+    def summary(self):
+        videos, faces, seconds = self._db().execute(
+            'SELECT COUNT(*), COALESCE(SUM(faces), 0), COALESCE(SUM(seconds), 0) FROM videos').fetchone()
+        return {'videos': videos, 'faces': faces, 'seconds': seconds}
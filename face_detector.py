@@ -0,0 +1,196 @@
+# face_detector.py
+import time
+import threading
+import cv2
+import numpy as np
+
+CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+
+# Speed/recall presets. "accurate" is exactly what the extraction scripts always ran.
+#   scale          - detection runs on the grayscale frame resized by this factor
+#   scale_factor   - detectMultiScale pyramid step
+#   min_neighbors  - detectMultiScale acceptance threshold
+#   min_size       - smallest face, in full-resolution pixels
+#   track          - reuse the previous boxes when the frame barely changed
+PRESETS = {
+    "accurate": dict(scale=1.0, scale_factor=1.1, min_neighbors=5, min_size=30, track=False),
+    "balanced": dict(scale=0.5, scale_factor=1.1, min_neighbors=4, min_size=30, track=True),
+    "fast": dict(scale=0.33, scale_factor=1.2, min_neighbors=3, min_size=36, track=True),
+}
+
+# Thumbnail used to decide whether a frame is "close" to the previous one
+THUMB_SIZE = (32, 32)
+
+
+class FaceDetector:
+    """Haar-cascade face detector that works on a downscaled copy of the frame
+
+    Boxes are always returned in full-resolution (x, y, w, h) coordinates.
+    """
+
+    def __init__(self, preset="accurate", motion_threshold=4.0, max_skip=5, cascade_path=CASCADE_PATH):
+        if preset not in PRESETS:
+            raise ValueError(f"Unknown detector preset: {preset} (choose from {', '.join(PRESETS)})")
+        self.preset = preset
+        self.params = PRESETS[preset]
+        self.motion_threshold = motion_threshold
+        self.max_skip = max_skip
+        self.cascade = cv2.CascadeClassifier(cascade_path)
+        if self.cascade.empty():
+            raise RuntimeError(f"Failed to load face cascade: {cascade_path}")
+
+        self.frames = 0
+        self.cascade_calls = 0
+        self.detections = 0
+        self.seconds = 0.0
+        self.reset()
+
+    def reset(self):
+        """Forget the tracked box, call this between videos"""
+        self._last_thumb = None
+        self._last_faces = []
+        self._skipped_in_row = 0
+
+    def _is_close_to_previous(self, gray):
+        thumb = cv2.resize(gray, THUMB_SIZE, interpolation=cv2.INTER_AREA)
+        close = (
+            self._last_thumb is not None
+            and len(self._last_faces) > 0
+            and self._skipped_in_row < self.max_skip
+            and cv2.absdiff(thumb, self._last_thumb).mean() < self.motion_threshold
+        )
+        if not close:
+            self._last_thumb = thumb
+        return close
+
+    def _run_cascade(self, gray):
+        scale = self.params["scale"]
+        min_size = max(1, int(round(self.params["min_size"] * scale)))
+        small = gray if scale == 1.0 else cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        faces = self.cascade.detectMultiScale(
+            small,
+            scaleFactor=self.params["scale_factor"],
+            minNeighbors=self.params["min_neighbors"],
+            minSize=(min_size, min_size),
+        )
+        if len(faces) == 0:
+            return []
+
+        # Map back to full resolution and clip to the frame
+        height, width = gray.shape[:2]
+        boxes = np.round(np.asarray(faces, dtype=np.float32) / scale).astype(int)
+        boxes[:, 2] = np.minimum(boxes[:, 2], width - boxes[:, 0])
+        boxes[:, 3] = np.minimum(boxes[:, 3], height - boxes[:, 1])
+        return [tuple(box) for box in boxes.tolist()]
+
+    def detect(self, frame):
+        """Detect faces in one BGR or grayscale frame"""
+        start = time.perf_counter()
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        if self.params["track"] and self._is_close_to_previous(gray):
+            self._skipped_in_row += 1
+            faces = self._last_faces
+        else:
+            faces = self._run_cascade(gray)
+            self.cascade_calls += 1
+            self._last_faces = faces
+            self._skipped_in_row = 0
+
+        self.frames += 1
+        self.detections += len(faces)
+        self.seconds += time.perf_counter() - start
+        return faces
+
+    def detect_batch(self, frames):
+        """Detect faces in a sequence of frames from the same video, in order"""
+        return [self.detect(frame) for frame in frames]
+
+    def stats(self):
+        return {
+            "preset": self.preset,
+            "frames": self.frames,
+            "cascade_calls": self.cascade_calls,
+            "skipped": self.frames - self.cascade_calls,
+            "detections": self.detections,
+            "frames_per_sec": self.frames / self.seconds if self.seconds > 0 else 0.0,
+            "detections_per_sec": self.detections / self.seconds if self.seconds > 0 else 0.0,
+        }
+
+
+class DetectorPool:
+    """Hands every thread its own FaceDetector, built once and reused
+
+    CascadeClassifier objects carry internal buffers, so sharing one across
+    threads is not safe; building one per frame is slow.
+    """
+
+    def __init__(self, preset="accurate", **kwargs):
+        self.preset = preset
+        self.kwargs = kwargs
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._detectors = []
+
+    def get(self):
+        detector = getattr(self._local, "detector", None)
+        if detector is None:
+            detector = FaceDetector(self.preset, **self.kwargs)
+            self._local.detector = detector
+            with self._lock:
+                self._detectors.append(detector)
+        return detector
+
+    def stats(self):
+        """Counters summed over every detector the pool has handed out"""
+        with self._lock:
+            detectors = list(self._detectors)
+        frames = sum(d.frames for d in detectors)
+        calls = sum(d.cascade_calls for d in detectors)
+        detections = sum(d.detections for d in detectors)
+        seconds = sum(d.seconds for d in detectors)
+        return {
+            "preset": self.preset,
+            "detectors": len(detectors),
+            "frames": frames,
+            "cascade_calls": calls,
+            "skipped": frames - calls,
+            "detections": detections,
+            "frames_per_sec": frames / seconds if seconds > 0 else 0.0,
+            "detections_per_sec": detections / seconds if seconds > 0 else 0.0,
+        }
+
+
+def crop_face(frame, box, padding=20, size=224):
+    """Padded, resized face crop exactly as extraction saves it (None if empty)"""
+    x, y, w, h = box
+    x1 = max(0, x - padding)
+    y1 = max(0, y - padding)
+    x2 = min(frame.shape[1], x + w + padding)
+    y2 = min(frame.shape[0], y + h + padding)
+
+    face_img = frame[y1:y2, x1:x2]
+    if face_img.size == 0:
+        return None
+    return cv2.resize(face_img, (size, size))
+
+
+def box_iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ax2, ay2 = a[0] + a[2], a[1] + a[3]
+    bx2, by2 = b[0] + b[2], b[1] + b[3]
+    iw = max(0, min(ax2, bx2) - max(a[0], b[0]))
+    ih = max(0, min(ay2, by2) - max(a[1], b[1]))
+    inter = iw * ih
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match_recall(reference_faces, faces, iou_threshold=0.5):
+    """How many reference boxes have a detected box overlapping them"""
+    matched = 0
+    for ref in reference_faces:
+        if any(box_iou(ref, face) >= iou_threshold for face in faces):
+            matched += 1
+    return matched
@@ -0,0 +1,296 @@
+# face_shards.py
+import os
+import glob
+import cv2
+import numpy as np
+
+# Every extracted crop has this shape (see extract_faces.py)
+CROP_SHAPE = (224, 224, 3)
+
+# One record per crop, appended to "<shard>.index" next to the data file
+INDEX_DTYPE = np.dtype([
+    ('video_id', 'S128'),   # DeepFakeDetection ids run past 48 bytes
+    ('method', 'S24'),      # source directory, e.g. "original" or "Deepfakes"
+    ('frame_idx', '<i4'),
+    ('face_idx', '<i2'),
+    ('label', '<i1'),       # 0 = real, 1 = fake
+    ('x', '<i4'),
+    ('y', '<i4'),
+    ('w', '<i4'),
+    ('h', '<i4'),
+    ('offset', '<i8'),      # byte offset of the crop inside the data file
+    ('length', '<i8'),      # byte length of the crop
+])
+
+# First bytes of every index file; older indexes (32-byte video ids) have none
+INDEX_MAGIC = b'FSIDX002'
+
+# "jpeg" concatenates encoded JPEGs, "raw" stores uint8 HxWx3 arrays back to back
+ENCODINGS = {"jpeg": ".jpeg.shard", "raw": ".raw.shard"}
+
+
+class ShardWriter:
+    """Append face crops to large shard files instead of one JPEG per crop
+
+    Crops are buffered in memory and written with one write() per flush. The
+    data is appended before the index records, so a crash can never leave an
+    index entry pointing past the end of the data.
+    """
+
+    def __init__(self, shard_dir, prefix="shard", encoding="jpeg", max_shard_bytes=1 << 30,
+                 batch_size=256, jpeg_quality=95):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown shard encoding: {encoding} (choose from {', '.join(ENCODINGS)})")
+        os.makedirs(shard_dir, exist_ok=True)
+        self.shard_dir = shard_dir
+        self.prefix = prefix
+        self.encoding = encoding
+        self.max_shard_bytes = max_shard_bytes
+        self.batch_size = batch_size
+        self.jpeg_quality = jpeg_quality
+
+        self._shard_num = 0
+        self._shard_bytes = 0
+        self._buffer = []
+        self._records = []
+        self._open_next_shard()
+
+    def _shard_path(self, num):
+        return os.path.join(self.shard_dir, f"{self.prefix}-{num:04d}")
+
+    def _open_next_shard(self):
+        # Never append to a shard left over from an earlier run
+        while any(os.path.exists(self._shard_path(self._shard_num) + ext)
+                  for ext in [".index"] + list(ENCODINGS.values())):
+            self._shard_num += 1
+        self._base = self._shard_path(self._shard_num)
+        self._shard_bytes = 0
+
+    def add(self, crop, video_id, method, frame_idx, face_idx, bbox, label):
+        """Queue one crop; returns False if it could not be encoded"""
+        if self.encoding == "jpeg":
+            ok, encoded = cv2.imencode('.jpg', crop, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if not ok:
+                return False
+            payload = encoded.tobytes()
+        else:
+            if crop.shape != CROP_SHAPE or crop.dtype != np.uint8:
+                crop = cv2.resize(crop, CROP_SHAPE[1::-1]).astype(np.uint8)
+            payload = np.ascontiguousarray(crop).tobytes()
+
+        x, y, w, h = bbox
+        record = (_encode_field('video_id', video_id), _encode_field('method', method),
+                  frame_idx, face_idx, label, x, y, w, h, 0, len(payload))
+        self._buffer.append(payload)
+        self._records.append(record)
+
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self):
+        """Write every queued crop and its index records"""
+        if not self._buffer:
+            return
+
+        records = np.array(self._records, dtype=INDEX_DTYPE)
+        records['offset'] = self._shard_bytes + np.concatenate(([0], np.cumsum(records['length'][:-1])))
+
+        with open(self._base + ENCODINGS[self.encoding], 'ab') as f:
+            f.write(b''.join(self._buffer))
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self._base + ".index", 'ab') as f:
+            if f.tell() == 0:
+                f.write(INDEX_MAGIC)
+            f.write(records.tobytes())
+
+        self._shard_bytes += int(records['length'].sum())
+        self._buffer = []
+        self._records = []
+
+        if self._shard_bytes >= self.max_shard_bytes:
+            self._shard_num += 1
+            self._open_next_shard()
+
+    def discard(self):
+        """Drop the queued crops and records without writing them, e.g. of a video that failed part-way"""
+        self._buffer = []
+        self._records = []
+
+    def close(self):
+        self.flush()
+
+
+def _encode_field(name, value):
+    """value as bytes for an index field; too long raises, a cut id would match other videos"""
+    encoded = value.encode()
+    if len(encoded) > INDEX_DTYPE[name].itemsize:
+        raise ValueError(f"Shard index {name} longer than {INDEX_DTYPE[name].itemsize} bytes: {value}")
+    return encoded
+
+
+def read_index(index_path):
+    """Records of one shard index file"""
+    with open(index_path, 'rb') as f:
+        if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+            raise ValueError(f"{index_path} was written by an older extract_faces.py "
+                             f"(32-byte video ids), extract those videos again")
+        return np.fromfile(f, dtype=INDEX_DTYPE)
+
+
+def drop_videos(shard_dir, keys):
+    """Remove the index records of (method, video_id) pairs from every shard in shard_dir
+
+    Call before re-extracting those videos, so the new crops replace the old
+    ones instead of adding to them. Only index files are rewritten (each
+    atomically); the old crop bytes stay in the data files, unreferenced.
+    Returns the number of records dropped.
+    """
+    keys = np.array(sorted({method.encode() + b'/' + video_id.encode() for method, video_id in keys}))
+    dropped = 0
+    if len(keys) == 0:
+        return dropped
+    for index_path in sorted(glob.glob(os.path.join(shard_dir, "*.index"))):
+        records = read_index(index_path)
+        stale = np.isin(np.char.add(np.char.add(records['method'], b'/'), records['video_id']), keys)
+        if not stale.any():
+            continue
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(INDEX_MAGIC)
+            f.write(records[~stale].tobytes())
+        os.replace(tmp_path, index_path)
+        dropped += int(stale.sum())
+    return dropped
+
+
+class ShardReader:
+    """Random access to every crop in a directory of shards
+
+    Data files are memory-mapped lazily (so each DataLoader worker maps its
+    own copy after fork). Raw crops come back as read-only views into the map;
+    JPEG crops are decoded straight from the mapped bytes.
+    """
+
+    def __init__(self, shard_dirs):
+        if isinstance(shard_dirs, str):
+            shard_dirs = [shard_dirs]
+
+        self.data_paths = []
+        indexes = []
+        for shard_dir in shard_dirs:
+            for index_path in sorted(glob.glob(os.path.join(shard_dir, "*.index"))):
+                base = index_path[:-len(".index")]
+                for encoding, ext in ENCODINGS.items():
+                    if os.path.exists(base + ext):
+                        break
+                else:
+                    continue
+                records = read_index(index_path)
+                indexes.append((len(self.data_paths), encoding, records))
+                self.data_paths.append(base + ext)
+
+        self.encodings = [encoding for _, encoding, _ in indexes]
+        if indexes:
+            self.metadata = np.concatenate([records for _, _, records in indexes])
+            self.shard_ids = np.concatenate([np.full(len(records), shard_id, dtype=np.int32)
+                                             for shard_id, _, records in indexes])
+        else:
+            self.metadata = np.zeros(0, dtype=INDEX_DTYPE)
+            self.shard_ids = np.zeros(0, dtype=np.int32)
+        self._maps = {}
+
+    def __len__(self):
+        return len(self.metadata)
+
+    def _map(self, shard_id):
+        mm = self._maps.get(shard_id)
+        if mm is None:
+            mm = np.memmap(self.data_paths[shard_id], dtype=np.uint8, mode='r')
+            self._maps[shard_id] = mm
+        return mm
+
+    def encoded(self, idx):
+        """The stored bytes of one crop, as a view into the mapped shard"""
+        record = self.metadata[idx]
+        start = int(record['offset'])
+        return self._map(int(self.shard_ids[idx]))[start:start + int(record['length'])]
+
+    def crop(self, idx):
+        """One crop as an HxWx3 BGR uint8 array"""
+        data = self.encoded(idx)
+        if self.encodings[self.shard_ids[idx]] == "raw":
+            return data.reshape(CROP_SHAPE)
+        return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+    def crop_tensor(self, idx):
+        """One crop as an RGB uint8 CHW torch tensor, skipping the PIL round trip"""
+        import torch
+        from torchvision.io import decode_jpeg, ImageReadMode
+
+        data = self.encoded(idx)
+        if self.encodings[self.shard_ids[idx]] == "raw":
+            # BGR HWC view -> RGB CHW copy in one gather
+            return torch.from_numpy(data.reshape(CROP_SHAPE)[:, :, ::-1].transpose(2, 0, 1).copy())
+        return decode_jpeg(torch.from_numpy(np.array(data)), mode=ImageReadMode.RGB)
+
+    def video_runs(self, rows):
+        """(start, stop) positions into rows, one per run of consecutive rows of one video in one shard
+
+        Extraction writes a video's crops back to back, so a run's crops sit in
+        one contiguous byte range of the shard.
+        """
+        rows = np.asarray(rows)
+        if len(rows) == 0:
+            return np.zeros((0, 2), dtype=np.int64)
+        records = self.metadata[rows]
+        shards = self.shard_ids[rows]
+        change = ((rows[1:] != rows[:-1] + 1) | (shards[1:] != shards[:-1])
+                  | (records['method'][1:] != records['method'][:-1])
+                  | (records['video_id'][1:] != records['video_id'][:-1]))
+        starts = np.concatenate(([0], np.flatnonzero(change) + 1))
+        return np.stack([starts, np.append(starts[1:], len(rows))], axis=1)
+
+    def block(self, rows):
+        """(payloads, encoding) of crops from one shard, fetched with a single contiguous read"""
+        shard_id = int(self.shard_ids[rows[0]])
+        records = self.metadata[rows]
+        start = int(records['offset'].min())
+        stop = int((records['offset'] + records['length']).max())
+        span = np.array(self._map(shard_id)[start:stop])
+        payloads = [span[offset - start:offset - start + length]
+                    for offset, length in zip(records['offset'].tolist(), records['length'].tolist())]
+        return payloads, self.encodings[shard_id]
+
+    def crops(self, rows):
+        """HxWx3 BGR crops of rows that share a shard (e.g. one video run), read as one block"""
+        payloads, encoding = self.block(rows)
+        if encoding == "raw":
+            return [payload.reshape(CROP_SHAPE) for payload in payloads]
+        return [cv2.imdecode(payload, cv2.IMREAD_COLOR) for payload in payloads]
+
+    def crop_tensors(self, rows):
+        """RGB uint8 (K, 3, H, W) tensor of rows that share a shard, read as one block"""
+        import torch
+        from torchvision.io import decode_jpeg, ImageReadMode
+
+        payloads, encoding = self.block(rows)
+        if encoding == "raw":
+            crops = np.stack([payload.reshape(CROP_SHAPE) for payload in payloads])
+            return torch.from_numpy(np.ascontiguousarray(crops[:, :, :, ::-1].transpose(0, 3, 1, 2)))
+        return torch.stack([decode_jpeg(torch.from_numpy(payload), mode=ImageReadMode.RGB)
+                            for payload in payloads])
+
+    def select(self, keys):
+        """Row indices whose (method, video_id) pair is in keys"""
+        keys = {(method.encode(), video_id.encode()) for method, video_id in keys}
+        return np.array([i for i, (method, video_id) in
+                         enumerate(zip(self.metadata['method'], self.metadata['video_id']))
+                         if (method, video_id) in keys], dtype=np.int64)
+
+    def __getstate__(self):
+        # Memory maps are per process, re-open them after pickling
+        state = self.__dict__.copy()
+        state['_maps'] = {}
+        return state
@@ -0,0 +1,52 @@
+# fast_decode.py
+import torch
+from PIL import Image
+from torchvision.io import read_file, decode_jpeg, ImageReadMode
+import torchvision.transforms.functional as TF
+
+# ImageNet statistics used by every VGG19 transform in the project
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+def decode_face(path, size=(224, 224), allow_draft=False):
+    """Decode a face crop straight into a uint8 CHW tensor of the given size
+
+    Crops written by extraction are already 224x224, so normally this is a
+    single libjpeg decode with no resize and no float copy. When the target is
+    at least 2x smaller than the stored image, allow_draft uses PIL's draft
+    mode so libjpeg decodes at reduced size in the DCT domain first.
+    """
+    height, width = size
+
+    if allow_draft:
+        with Image.open(path) as img:
+            if img.format == 'JPEG' and img.width >= 2 * width and img.height >= 2 * height:
+                img.draft('RGB', (width, height))
+                image = TF.pil_to_tensor(img.convert('RGB'))
+                return TF.resize(image, [height, width], antialias=True)
+
+    image = decode_jpeg(read_file(path), mode=ImageReadMode.RGB)
+    if image.shape[1] != height or image.shape[2] != width:
+        image = TF.resize(image, [height, width], antialias=True)
+    return image
+
+
+def normalize_batch(images, device=None, mean=IMAGENET_MEAN, std=IMAGENET_STD, augment=None):
+    """uint8 NCHW batch -> normalized float batch, in one pass over the collated batch
+
+    Moving to the device first means only uint8 bytes cross the bus. Float
+    batches are passed through unchanged, so callers can use this on any loader.
+    augment (e.g. BatchAugment) runs on the [0, 255] float batch before normalizing.
+    """
+    if device is not None:
+        images = images.to(device, non_blocking=True)
+    if images.dtype != torch.uint8:
+        return images
+
+    images = augment(images) if augment is not None else images.float()
+
+    mean = torch.tensor(mean, device=images.device).view(1, -1, 1, 1) * 255.0
+    inv_std = 1.0 / (torch.tensor(std, device=images.device).view(1, -1, 1, 1) * 255.0)
+    # (x - 255*mean) / (255*std) == (x/255 - mean) / std
+    return images.sub_(mean).mul_(inv_std)
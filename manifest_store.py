@@ -0,0 +1,132 @@
+# manifest_store.py
+import os
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+# One record per video. Paths are stored normalized ("data/.../Deepfakes/000_003.mp4")
+MANIFEST_DTYPE = np.dtype([
+    ('path', 'S160'),
+    ('method', 'S24'),      # source directory, e.g. "original" or "Deepfakes"
+    ('video_id', 'S48'),    # file name without extension, e.g. "000_003"
+    ('label', '<i1'),       # 0 = real, 1 = fake
+    ('size', '<i8'),        # bytes
+    ('frames', '<i4'),      # -1 when not probed
+    ('fps', '<f4'),
+    ('duration', '<f4'),    # seconds
+])
+# String fields whose width grows with the data (the widths above are minimums)
+STRING_FIELDS = ('path', 'method', 'video_id')
+
+MANIFEST_SUFFIX = '.npy'
+LEGACY_SUFFIX = '.csv'
+
+
+def normalize_path(path):
+    """Forward-slash, normalized path, whatever OS wrote the manifest"""
+    return os.path.normpath(path.replace('\\', '/')).replace(os.sep, '/')
+
+
+def _scan_dir(video_dir, label):
+    """[(path, method, video_id, label, size)] of every .mp4 in video_dir, one scandir pass"""
+    method = os.path.basename(os.path.normpath(video_dir))
+    rows = []
+    with os.scandir(video_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith('.mp4') and entry.is_file():
+                rows.append((normalize_path(entry.path), method, os.path.splitext(entry.name)[0],
+                             label, entry.stat().st_size))
+    return rows
+
+
+def probe_video(path):
+    """(frames, fps, duration) from the container header, (-1, 0, 0) if unreadable"""
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            return -1, 0.0, 0.0
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = float(cap.get(cv2.CAP_PROP_FPS))
+        return frames, fps, frames / fps if fps > 0 else 0.0
+    finally:
+        cap.release()
+
+
+def manifest_dtype(rows):
+    """MANIFEST_DTYPE with the string fields widened to the longest value in rows
+
+    DeepFakeDetection ids ("01_02__walking_down_street_outside_angry__XXXXXXXX")
+    do not fit the default widths, so every manifest is sized from what was scanned.
+    """
+    widths = {name: MANIFEST_DTYPE[name].itemsize for name in STRING_FIELDS}
+    for row in rows:
+        for name, value in zip(STRING_FIELDS, row):
+            widths[name] = max(widths[name], len(value.encode()))
+    return np.dtype([(name, f'S{widths[name]}' if name in widths else MANIFEST_DTYPE[name])
+                     for name in MANIFEST_DTYPE.names])
+
+
+def scan_videos(sources, workers=8, probe=True):
+    """Structured manifest of every video under sources, a list of (video_dir, label)
+
+    Directories are listed concurrently with os.scandir, then every file is
+    probed for frame count and fps on the same thread pool (OpenCV releases
+    the GIL while parsing the container).
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        rows = [row for dir_rows in pool.map(lambda source: _scan_dir(*source), sources) for row in dir_rows]
+        rows.sort()
+        probes = pool.map(probe_video, [row[0] for row in rows]) if probe else None
+        manifest = np.zeros(len(rows), dtype=manifest_dtype(rows))
+        for i, row in enumerate(rows):
+            frames, fps, duration = next(probes) if probe else (-1, 0.0, 0.0)
+            manifest[i] = _encode_row(*row, frames, fps, duration)
+    return manifest
+
+
+def _encode_row(path, method, video_id, label, size=0, frames=-1, fps=0.0, duration=0.0):
+    return (path.encode(), method.encode(), video_id.encode(), label, size, frames, fps, duration)
+
+
+def save_manifest(manifest, path):
+    """Write a structured manifest atomically"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, manifest)
+    os.replace(tmp_path, path)
+
+
+def load_legacy_csv(path):
+    """Structured manifest from an old "path,label" CSV (no size or timing columns)"""
+    rows = []
+    with open(path, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            video_path, label = line.strip().rsplit(',', 1)
+            video_path = normalize_path(video_path)
+            parts = video_path.split('/')
+            rows.append((video_path, parts[-2] if len(parts) > 1 else '',
+                         os.path.splitext(parts[-1])[0], int(label)))
+    return np.array([_encode_row(*row) for row in rows], dtype=manifest_dtype(rows))
+
+
+def load_manifest(path):
+    """Memory-mapped structured manifest (.npy), or a parsed legacy .csv"""
+    if path.endswith(LEGACY_SUFFIX):
+        return load_legacy_csv(path)
+    return np.load(path, mmap_mode='r')
+
+
+def resolve_manifest(split, manifest_dir='manifests'):
+    """Path of the split's manifest, preferring the structured file over the legacy CSV"""
+    base = os.path.join(manifest_dir, f'{split}_manifest')
+    if os.path.exists(base + MANIFEST_SUFFIX):
+        return base + MANIFEST_SUFFIX
+    return base + LEGACY_SUFFIX
+
+
+def video_keys(methods, video_ids):
+    """One b"method/video_id" key per row, for vectorized joins with np.isin"""
+    return np.char.add(np.char.add(np.asarray(methods), b'/'), np.asarray(video_ids))
@@ -0,0 +1,139 @@
+# model_development/balanced_sampler.py
+import numpy as np
+from torch.utils.data import Sampler
+
+BALANCE_MODES = ('label', 'label_method')
+
+# Stratum choices are generated this many draws at a time
+BLOCK_SIZE = 4096
+
+
+def dataset_strata(dataset):
+    """(labels, methods) arrays with one entry per sample of a DeepFakeDataset or FaceShardDataset"""
+    if hasattr(dataset, 'manifest'):
+        return np.asarray(dataset.manifest['label']), np.asarray(dataset.manifest['method'])
+    if hasattr(dataset, 'reader'):
+        rows = dataset.indices
+        if getattr(dataset, 'clips', None) is not None:
+            rows = rows[dataset.clips[:, 0]]
+        metadata = dataset.reader.metadata
+        return metadata['label'][rows], metadata['method'][rows]
+    raise TypeError(f"Cannot find labels and methods of a {type(dataset).__name__}")
+
+
+class BalancedStreamSampler(Sampler):
+    """Endless stream of sample indices, balanced across label and manipulation method
+
+    Every draw first picks a stratum, then the next index of that stratum's
+    shuffled index array, so a draw costs O(1) however skewed the dataset is.
+    "label" gives real and fake half the draws each; "label_method" also
+    splits the fake half evenly over the manipulation methods. A stratum that
+    runs out is reshuffled and starts over, rare strata simply repeat more.
+
+    All randomness is derived from (seed, block) and (seed, stratum, pass),
+    so the stream is fully described by the seed and the number of draws.
+    That makes state_dict tiny and resuming exact. Each iteration over the
+    sampler yields the next samples_per_epoch indices of the stream (default:
+    the dataset size), so "epochs" are just slices of one stream;
+    endless=True never stops.
+    """
+
+    def __init__(self, labels, methods=None, balance='label_method', samples_per_epoch=None, seed=0,
+                 endless=False):
+        if balance not in BALANCE_MODES:
+            raise ValueError(f"Unknown balance mode: {balance} (choose from {', '.join(BALANCE_MODES)})")
+        labels = np.asarray(labels).astype(np.int64)
+        if methods is None or balance == 'label':
+            methods = np.zeros(len(labels), dtype='S1')
+        methods = np.asarray(methods)
+        self.balance = balance
+        self.seed = seed
+        self.num_samples = len(labels)
+        self.samples_per_epoch = None if endless else (samples_per_epoch or self.num_samples)
+
+        # One index array per (label, method) stratum
+        keys, inverse = np.unique(np.stack([labels.astype(str), methods.astype(str)]), axis=1, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.cumsum(np.bincount(inverse, minlength=keys.shape[1]))[:-1]
+        self.members = np.split(order, bounds)
+        self.strata = [(int(label), str(method)) for label, method in keys.T]
+
+        # Each label gets an equal share, split evenly over its strata
+        stratum_labels = np.array([label for label, _ in self.strata])
+        unique_labels = np.unique(stratum_labels)
+        self.weights = np.array([1.0 / len(unique_labels) / (stratum_labels == label).sum()
+                                 for label in stratum_labels])
+        self._reset(0)
+
+    def _block(self, block_idx):
+        rng = np.random.default_rng([self.seed, 0, block_idx])
+        return rng.choice(len(self.members), size=BLOCK_SIZE, p=self.weights)
+
+    def _permutation(self, stratum, epoch):
+        rng = np.random.default_rng([self.seed, 1, stratum, epoch])
+        return rng.permutation(self.members[stratum])
+
+    def _reset(self, draws):
+        """Fast-forward to draws draws into the stream, replaying only the stratum choices"""
+        self._draws = draws
+        self._positions = np.zeros(len(self.members), dtype=np.int64)
+        full_blocks, offset = divmod(draws, BLOCK_SIZE)
+        for block_idx in range(full_blocks):
+            self._positions += np.bincount(self._block(block_idx), minlength=len(self.members))
+        self._block_idx = full_blocks
+        self._choices = self._block(full_blocks)
+        self._positions += np.bincount(self._choices[:offset], minlength=len(self.members))
+        self._perms = {}
+
+    def draw(self):
+        block_idx, offset = divmod(self._draws, BLOCK_SIZE)
+        if block_idx != self._block_idx:
+            self._block_idx = block_idx
+            self._choices = self._block(block_idx)
+        stratum = self._choices[offset]
+        epoch, position = divmod(int(self._positions[stratum]), len(self.members[stratum]))
+        cached = self._perms.get(stratum)
+        if cached is None or cached[0] != epoch:
+            cached = (epoch, self._permutation(stratum, epoch))
+            self._perms[stratum] = cached
+        self._positions[stratum] += 1
+        self._draws += 1
+        return int(cached[1][position])
+
+    def __iter__(self):
+        if self.samples_per_epoch is None:
+            while True:
+                yield self.draw()
+        for _ in range(self.samples_per_epoch):
+            yield self.draw()
+
+    def __len__(self):
+        if self.samples_per_epoch is None:
+            raise TypeError("An endless BalancedStreamSampler has no length")
+        return self.samples_per_epoch
+
+    def state_dict(self, draws=None):
+        """Position in the stream
+
+        DataLoader pulls indices ahead of the batches it has handed out, so
+        mid-epoch pass the number of samples actually consumed as draws.
+        """
+        return {
+            'seed': self.seed,
+            'balance': self.balance,
+            'num_samples': self.num_samples,
+            'draws': self._draws if draws is None else draws,
+        }
+
+    def load_state_dict(self, state):
+        for key in ('seed', 'balance', 'num_samples'):
+            if state[key] != getattr(self, key):
+                raise ValueError(f"Sampler state was saved with {key}={state[key]!r}, "
+                                 f"this sampler has {getattr(self, key)!r}")
+        self._reset(state['draws'])
+
+    def stats(self):
+        """Samples per stratum and the share of draws each stratum gets"""
+        return [{'label': label, 'method': method, 'samples': len(members), 'weight': float(weight)}
+                for (label, method), members, weight in zip(self.strata, self.members, self.weights)]
@@ -0,0 +1,81 @@
+# model_development/batch_augment.py
+import math
+import torch
+import torch.nn.functional as F
+
+# ITU-R 601 luma weights, as used by torchvision's adjust_contrast
+LUMA_WEIGHTS = (0.299, 0.587, 0.114)
+
+
+class BatchAugment:
+    """The train augmentations applied to a whole collated batch at once
+
+    Same recipe as the per-sample pipeline (RandomHorizontalFlip,
+    RandomRotation(10), ColorJitter(brightness=0.2, contrast=0.2)), but every
+    op is one vectorized call over NCHW. Each sample still draws its own
+    parameters, from a seeded generator so runs are reproducible.
+    """
+
+    def __init__(self, flip_p=0.5, degrees=10, brightness=0.2, contrast=0.2, seed=0):
+        self.flip_p = flip_p
+        self.degrees = degrees
+        self.brightness = brightness
+        self.contrast = contrast
+        self.generator = torch.Generator()
+        self.generator.manual_seed(seed)
+
+    def sample_params(self, batch_size):
+        """Per-sample random parameters, drawn on the CPU so results do not depend on the device"""
+        g = self.generator
+        flip = torch.rand(batch_size, generator=g) < self.flip_p
+        angle = (torch.rand(batch_size, generator=g) * 2 - 1) * self.degrees
+        brightness = 1 + (torch.rand(batch_size, generator=g) * 2 - 1) * self.brightness
+        contrast = 1 + (torch.rand(batch_size, generator=g) * 2 - 1) * self.contrast
+        return flip, angle, brightness, contrast
+
+    def __call__(self, images, max_value=None):
+        """Augment an NCHW batch; uint8 input comes back as float in [0, 255]"""
+        if images.dtype == torch.uint8:
+            images = images.float()
+            max_value = 255.0 if max_value is None else max_value
+        elif max_value is None:
+            max_value = 1.0
+
+        n = images.shape[0]
+        device = images.device
+        flip, angle, brightness, contrast = (p.to(device) for p in self.sample_params(n))
+
+        # Horizontal flip: select between the batch and its mirror per sample
+        images = torch.where(flip.view(-1, 1, 1, 1), images.flip(-1), images)
+
+        # Rotation: one affine grid and one grid_sample for the whole batch
+        if self.degrees:
+            radians = angle * (math.pi / 180)
+            cos, sin = torch.cos(radians), torch.sin(radians)
+            zeros = torch.zeros_like(cos)
+            theta = torch.stack([
+                torch.stack([cos, -sin, zeros], dim=1),
+                torch.stack([sin, cos, zeros], dim=1),
+            ], dim=1)
+            grid = F.affine_grid(theta, images.shape, align_corners=False)
+            images = F.grid_sample(images, grid, mode='nearest', padding_mode='zeros', align_corners=False)
+
+        # Brightness: scale every pixel
+        images = (images * brightness.view(-1, 1, 1, 1)).clamp_(0, max_value)
+
+        # Contrast: blend towards each image's mean grey level
+        if images.shape[1] == 3:
+            weights = torch.tensor(LUMA_WEIGHTS, device=device).view(1, 3, 1, 1)
+            mean = (images * weights).sum(1, keepdim=True).mean((2, 3), keepdim=True)
+        else:
+            mean = images.mean((1, 2, 3), keepdim=True)
+        c = contrast.view(-1, 1, 1, 1)
+        images = images * c + mean * (1 - c)
+
+        return images.clamp_(0, max_value)
+
+    def state_dict(self):
+        return {'generator': self.generator.get_state()}
+
+    def load_state_dict(self, state):
+        self.generator.set_state(state['generator'])
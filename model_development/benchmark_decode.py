@@ -0,0 +1,83 @@
+# model_development/benchmark_decode.py
+import os
+import sys
+import time
+import shutil
+import tempfile
+import numpy as np
+import torch
+from PIL import Image
+from data_loader import get_transforms
+from fast_decode import decode_face, normalize_batch
+
+print("⏱️  Image Decode Benchmark")
+print("=" * 50)
+
+NUM_IMAGES = 512
+BATCH_SIZE = 32
+
+
+def write_crops(out_dir, count):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        # Smooth noise compresses like a real face crop, pure noise does not
+        small = rng.integers(0, 256, size=(28, 28, 3), dtype=np.uint8)
+        img = Image.fromarray(small).resize((224, 224), Image.BILINEAR)
+        path = os.path.join(out_dir, f"{i:05d}_frame0000_face0.jpg")
+        img.save(path, quality=95)
+        paths.append(path)
+    return paths
+
+
+def pil_path(paths):
+    """The current per-sample path: PIL decode, Resize, ToTensor, Normalize"""
+    _, test_transform = get_transforms()
+    for start in range(0, len(paths), BATCH_SIZE):
+        batch = [test_transform(Image.open(p).convert('RGB')) for p in paths[start:start + BATCH_SIZE]]
+        yield torch.stack(batch)
+
+
+def fast_path(paths):
+    """uint8 decode per sample, one float conversion + normalization per batch"""
+    for start in range(0, len(paths), BATCH_SIZE):
+        batch = torch.stack([decode_face(p) for p in paths[start:start + BATCH_SIZE]])
+        yield normalize_batch(batch)
+
+
+def run(name, loader, paths):
+    start = time.perf_counter()
+    samples = 0
+    for batch in loader(paths):
+        samples += len(batch)
+    elapsed = time.perf_counter() - start
+    print(f"   {name:>22}: {samples / elapsed:8.1f} samples/sec")
+    return samples / elapsed
+
+
+def main():
+    torch.set_num_threads(1)  # one loader worker's worth of CPU
+    tmp_dir = tempfile.mkdtemp(prefix="decode_bench_")
+    try:
+        paths = write_crops(tmp_dir, NUM_IMAGES)
+        print(f"🖼️  {len(paths)} synthetic 224x224 crops, batch size {BATCH_SIZE}\n")
+
+        # Warm both paths (file cache, libjpeg init)
+        for loader in (pil_path, fast_path):
+            for _ in loader(paths[:BATCH_SIZE]):
+                pass
+
+        slow = run("PIL + per-sample float", pil_path, paths)
+        fast = run("uint8 + batched float", fast_path, paths)
+        print(f"\n📊 Speedup: {fast / slow:.2f}x")
+        # Per-sample tensors handed from the worker to the training process
+        print(f"   Bytes per sample leaving the worker: "
+              f"{3 * 224 * 224 * 4} (float32) vs {3 * 224 * 224} (uint8)")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        NUM_IMAGES = int(sys.argv[1])
+    main()
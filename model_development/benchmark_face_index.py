@@ -0,0 +1,69 @@
+# model_development/benchmark_face_index.py
+import os
+import time
+import shutil
+import random
+import tempfile
+from data_loader import DeepFakeDataset
+
+print("⏱️  Face Lookup Benchmark")
+print("=" * 50)
+
+NUM_VIDEOS = 10000
+FACES_PER_VIDEO = 10  # 100k crops in total
+
+
+def legacy_lookup(face_dir, video_name):
+    """What DeepFakeDataset.__getitem__ used to do for every sample"""
+    face_files = [f for f in os.listdir(face_dir) if video_name in f]
+    return face_files[0] if face_files else None
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp(prefix="face_index_bench_")
+    try:
+        face_root = os.path.join(tmp_dir, "extracted_faces")
+        real_dir = os.path.join(face_root, "real")
+        os.makedirs(real_dir)
+        os.makedirs(os.path.join(face_root, "fake"))
+
+        print(f"📁 Creating {NUM_VIDEOS * FACES_PER_VIDEO} empty crops...")
+        video_ids = [f"{i:05d}" for i in range(NUM_VIDEOS)]
+        for video_id in video_ids:
+            for frame in range(FACES_PER_VIDEO):
+                open(os.path.join(real_dir, f"{video_id}_frame{frame * 30:04d}_face0.jpg"), 'w').close()
+
+        manifest = os.path.join(tmp_dir, "manifest.csv")
+        with open(manifest, 'w') as f:
+            for video_id in video_ids:
+                f.write(f"data/FaceForensics++_C23/original/{video_id}.mp4,0\n")
+
+        # Index construction, cold and from the cache file
+        for name, use_cache in [("build index", False), ("build + cache", True), ("load cache", True)]:
+            start = time.perf_counter()
+            dataset = DeepFakeDataset(manifest, face_root=face_root, use_index_cache=use_cache)
+            print(f"   {name:>14}: {time.perf_counter() - start:.3f}s")
+
+        sample_ids = random.Random(0).sample(range(len(dataset)), 200)
+
+        start = time.perf_counter()
+        for idx in sample_ids:
+            legacy_lookup(real_dir, os.path.splitext(os.path.basename(dataset.sample(idx)[0]))[0])
+        legacy = (time.perf_counter() - start) / len(sample_ids)
+
+        start = time.perf_counter()
+        for _ in range(100):
+            for idx in sample_ids:
+                dataset.pick_face_file(idx)
+        indexed = (time.perf_counter() - start) / (100 * len(sample_ids))
+
+        print(f"\n📊 Per-sample lookup latency ({NUM_VIDEOS * FACES_PER_VIDEO} crops)")
+        print(f"   listdir + substring scan: {legacy * 1e3:.3f} ms")
+        print(f"   index lookup:             {indexed * 1e6:.3f} µs")
+        print(f"   speedup:                  {legacy / indexed:.0f}x")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
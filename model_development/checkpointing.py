@@ -0,0 +1,341 @@
+# model_development/checkpointing.py
+import os
+import json
+import time
+import random
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import torch
+
+CHECKPOINT_DIR = 'checkpoints'
+BEST_NAME = 'best_model.pth'       # what inference.py loads
+INDEX_NAME = 'checkpoints.json'
+# One subdirectory per training run, e.g. checkpoints/runs/20240101-120000/epoch-0003.pth
+RUNS_DIR = 'runs'
+LOG_FILE = 'logs/checkpoints.jsonl'
+# Frozen base weights, one file per fingerprint, shared by every delta checkpoint
+BASE_NAME = 'base'
+BASE_DIR = os.path.join(CHECKPOINT_DIR, BASE_NAME)
+
+# Base weights already mapped in this process, keyed by fingerprint
+_bases = {}
+
+
+def snapshot(obj):
+    """CPU copy of every tensor in a (nested) state dict, safe to write while training continues"""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        return {key: snapshot(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot(value) for value in obj)
+    return obj
+
+
+def base_fingerprint(model):
+    """Hash of the frozen weights a delta checkpoint is applied on top of"""
+    digest = hashlib.sha1()
+    for name, tensor in sorted(model.frozen_state_dict().items()):
+        digest.update(name.encode())
+        digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+def base_path(fingerprint, base_dir=BASE_DIR):
+    return os.path.join(base_dir, f"{fingerprint}.pt")
+
+
+def base_dir_for(checkpoint_path):
+    """Base directory of a checkpoint file, found from the file's location, not the working directory
+
+    best_model.pth sits next to base/, epoch files two levels below it
+    (runs/<run>/). Falls back to BASE_DIR.
+    """
+    directory = os.path.dirname(os.path.abspath(checkpoint_path))
+    for candidate in (directory, os.path.dirname(os.path.dirname(directory))):
+        base_dir = os.path.join(candidate, BASE_NAME)
+        if os.path.isdir(base_dir):
+            return base_dir
+    return BASE_DIR
+
+
+def save_base(model, base_dir=BASE_DIR):
+    """Write the frozen weights once (skipped when already on disk) and return their fingerprint"""
+    fingerprint = base_fingerprint(model)
+    path = base_path(fingerprint, base_dir)
+    if not os.path.exists(path):
+        os.makedirs(base_dir, exist_ok=True)
+        start = time.perf_counter()
+        atomic_save(snapshot(model.frozen_state_dict()), path)
+        print(f"🧊 Frozen base {fingerprint}: {os.path.getsize(path) / 2**20:.1f} MB "
+              f"in {time.perf_counter() - start:.2f}s -> {path}")
+    return fingerprint
+
+
+def load_base(fingerprint, base_dir=BASE_DIR):
+    """Frozen weights as CPU tensors memory-mapped from the base file, shared through the page cache"""
+    base = _bases.get(fingerprint)
+    if base is None:
+        path = base_path(fingerprint, base_dir)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Delta checkpoint needs frozen base {path}, which does not exist")
+        base = torch.load(path, map_location='cpu', mmap=True, weights_only=True)
+        _bases[fingerprint] = base
+    return base
+
+
+def delta_state(model, fingerprint):
+    """Trainable tensors only, plus the fingerprint of the base they apply to"""
+    frozen = model.frozen_state_dict().keys()
+    return {
+        'base_fingerprint': fingerprint,
+        'trainable_state_dict': {name: tensor for name, tensor in model.state_dict().items()
+                                 if name not in frozen},
+    }
+
+
+def is_delta(checkpoint):
+    return 'base_fingerprint' in checkpoint
+
+
+def load_model_state(model, checkpoint, base_dir=BASE_DIR):
+    """Load a full or delta checkpoint into model
+
+    A model built on the meta device takes the mapped base tensors as they
+    are (no copy, no random init); otherwise the weights are copied into
+    the existing parameters.
+    """
+    if not is_delta(checkpoint):
+        model.load_state_dict(checkpoint['model_state_dict'])
+        return model
+    state = dict(load_base(checkpoint['base_fingerprint'], base_dir))
+    state.update(checkpoint['trainable_state_dict'])
+    assign = any(p.is_meta for p in model.parameters())
+    model.load_state_dict(state, assign=assign)
+    return model
+
+
+def rng_state():
+    """Global RNG states (dropout and any per-sample transform drawing from them)
+
+    Only tensors and plain Python values, so checkpoints still load with
+    torch.load(weights_only=True) as inference does.
+    """
+    name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    state = {
+        'python': random.getstate(),
+        'numpy': (name, keys.tolist(), pos, has_gauss, cached_gaussian),
+        'torch': torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    random.setstate(state['python'])
+    name, keys, pos, has_gauss, cached_gaussian = state['numpy']
+    np.random.set_state((name, np.array(keys, dtype=np.uint32), pos, has_gauss, cached_gaussian))
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+def _fsync_dir(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_save(obj, path):
+    """torch.save to a temp file, fsync, then rename over path, so path is never half written"""
+    directory = os.path.dirname(path) or '.'
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        with open(tmp_path, 'wb') as f:
+            torch.save(obj, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _fsync_dir(directory)
+
+
+def _atomic_link(source, path):
+    """Point path at source's data (hard link, or a copy where links are unsupported)"""
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, path)
+
+
+class CheckpointManager:
+    """Rolling last-N and best-K checkpoints, written atomically on a background thread
+
+    save() copies the state to the CPU (the only part training waits for)
+    and hands the torch.save to a single writer thread. At most one write is
+    in flight; a new save waits for the previous one, which bounds memory to
+    one extra copy of the state. The newest best checkpoint is also linked
+    to best_model.pth for inference.
+
+    Every training run keeps its checkpoints and index in its own
+    runs/<timestamp> directory, so rotation and "best" only ever compare
+    checkpoints of one run. A fresh run starts a new directory on its first
+    save; resume_from() continues an existing one.
+    """
+
+    def __init__(self, directory=CHECKPOINT_DIR, keep_last=3, keep_best=2, log_file=LOG_FILE):
+        self.directory = directory
+        self.runs_dir = os.path.join(directory, RUNS_DIR)
+        self.keep_last = keep_last
+        self.keep_best = keep_best
+        self.log_file = log_file
+        self.run_dir = None
+        self.entries = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='checkpoint')
+        self._pending = None
+
+    @property
+    def index_path(self):
+        return os.path.join(self.run_dir, INDEX_NAME)
+
+    def _start_run(self):
+        name = time.strftime('%Y%m%d-%H%M%S')
+        run_dir = os.path.join(self.runs_dir, name)
+        suffix = 1
+        while os.path.exists(run_dir):
+            suffix += 1
+            run_dir = os.path.join(self.runs_dir, f"{name}-{suffix}")
+        os.makedirs(run_dir)
+        self.run_dir = run_dir
+        self.entries = []
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return []
+        # Drop entries whose file is gone (deleted by hand, or a crash before the rename)
+        return [e for e in entries if os.path.exists(os.path.join(self.run_dir, e['file']))]
+
+    def _write_index(self):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def resume_from(self, path=None):
+        """Checkpoint to resume (default: the newest of the most recent run), or None
+
+        Resuming from an epoch file of a run continues that run; checkpoints
+        of later epochs are deleted, those epochs are about to be trained
+        again. Any other file (best_model.pth, a copied checkpoint)
+        is loaded and a new run is started.
+        """
+        self.wait()
+        if path is None:
+            runs = sorted(os.listdir(self.runs_dir)) if os.path.isdir(self.runs_dir) else []
+            for run in reversed(runs):
+                self.run_dir = os.path.join(self.runs_dir, run)
+                self.entries = self._load_index()
+                if self.entries:
+                    newest = max(self.entries, key=lambda e: e['epoch'])
+                    return os.path.join(self.run_dir, newest['file'])
+            self.run_dir, self.entries = None, []
+            return None
+        run_dir, name = os.path.split(os.path.abspath(path))
+        if os.path.dirname(run_dir) == os.path.abspath(self.runs_dir):
+            self.run_dir = run_dir
+            self.entries = self._load_index()
+            resumed = next((e for e in self.entries if e['file'] == name), None)
+            if resumed is not None:
+                for entry in self.entries:
+                    if entry['epoch'] > resumed['epoch']:
+                        os.remove(os.path.join(self.run_dir, entry['file']))
+                self.entries = [e for e in self.entries if e['epoch'] <= resumed['epoch']]
+                self._write_index()
+                return path
+        self.run_dir, self.entries = None, []
+        return path
+
+    def save(self, state, epoch, metric):
+        """Queue a checkpoint of state for epoch; returns once the CPU snapshot is taken"""
+        start = time.perf_counter()
+        state = snapshot(state)
+        snapshot_seconds = time.perf_counter() - start
+        self.wait()
+        if self.run_dir is None:
+            self._start_run()
+        self._pending = self._executor.submit(self._write, state, epoch, metric, snapshot_seconds)
+
+    def _write(self, state, epoch, metric, snapshot_seconds):
+        name = f"epoch-{epoch:04d}.pth"
+        path = os.path.join(self.run_dir, name)
+        start = time.perf_counter()
+        atomic_save(state, path)
+        seconds = time.perf_counter() - start
+        size = os.path.getsize(path)
+
+        previous_best = max((e['metric'] for e in self.entries), default=None)
+        self.entries = [e for e in self.entries if e['file'] != name]
+        self.entries.append({'file': name, 'epoch': epoch, 'metric': metric, 'bytes': size, 'time': time.time()})
+        is_best = previous_best is None or metric > previous_best
+        if is_best:
+            _atomic_link(path, os.path.join(self.directory, BEST_NAME))
+        self._rotate()
+        self._write_index()
+
+        record = {'epoch': epoch, 'file': os.path.relpath(path, self.directory), 'bytes': size, 'write_seconds': seconds,
+                  'snapshot_seconds': snapshot_seconds, 'metric': metric, 'best': is_best}
+        os.makedirs(os.path.dirname(self.log_file) or '.', exist_ok=True)
+        with open(self.log_file, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        print(f"💾 {name}: {size / 2**20:.1f} MB in {seconds:.2f}s (snapshot {snapshot_seconds:.2f}s)"
+              + (f", new best {metric:.2f}" if is_best else ""))
+
+    def _rotate(self):
+        by_epoch = sorted(self.entries, key=lambda e: e['epoch'], reverse=True)
+        by_metric = sorted(self.entries, key=lambda e: (e['metric'], e['epoch']), reverse=True)
+        keep = {e['file'] for e in by_epoch[:self.keep_last]} | {e['file'] for e in by_metric[:self.keep_best]}
+        for entry in self.entries:
+            if entry['file'] not in keep:
+                try:
+                    os.remove(os.path.join(self.run_dir, entry['file']))
+                except FileNotFoundError:
+                    pass
+        self.entries = [e for e in self.entries if e['file'] in keep]
+
+    def wait(self):
+        """Block until the queued write (if any) is on disk; re-raises its error"""
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            pending.result()
+
+    def latest(self):
+        """Path of the newest checkpoint of the current run, or None"""
+        self.wait()
+        if not self.entries:
+            return None
+        newest = max(self.entries, key=lambda e: e['epoch'])
+        return os.path.join(self.run_dir, newest['file'])
+
+    def close(self):
+        self.wait()
+        self._executor.shutdown()
@@ -0,0 +1,41 @@
+# model_development/clips.py
+import random
+import numpy as np
+
+CLIP_SAMPLING = ('even', 'random')
+
+
+def pick_clip(num_faces, clip_size, sampling='even', rng=random):
+    """Positions of clip_size faces out of num_faces, in video order
+
+    "even" spreads the clip over the whole video (deterministic, for
+    evaluation); "random" draws a different sorted subset every call. Videos
+    with fewer faces than clip_size repeat faces.
+    """
+    if num_faces <= 0:
+        return []
+    if sampling == 'random':
+        if num_faces >= clip_size:
+            return sorted(rng.sample(range(num_faces), clip_size))
+        return sorted(rng.choice(range(num_faces)) for _ in range(clip_size))
+    if sampling != 'even':
+        raise ValueError(f"Unknown clip sampling: {sampling} (choose from {', '.join(CLIP_SAMPLING)})")
+    return np.linspace(0, num_faces - 1, clip_size).round().astype(int).tolist()
+
+
+def flatten_clips(images):
+    """(B, K, C, H, W) clip batch -> ((B*K, C, H, W), K); image batches pass through with K=None"""
+    if images.dim() != 5:
+        return images, None
+    return images.flatten(0, 1), images.shape[1]
+
+
+def video_logits(logits, clip_size):
+    """Per-crop logits (B*K x 2) -> per-video logits (B x 2), averaging each clip
+
+    Averaging logits averages the fake-vs-real margin, the same per-video
+    aggregation as inference's default "mean".
+    """
+    if clip_size is None:
+        return logits
+    return logits.view(-1, clip_size, logits.shape[-1]).mean(1)
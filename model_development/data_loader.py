@@ -1,52 +1,186 @@
 # model_development/data_loader.py
 import torch
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, RandomSampler
 from torchvision import transforms
 from PIL import Image
 import os
+import re
+import sys
+import json
+import random
+import numpy as np
 import pandas as pd
 
+# Shared extraction modules live in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from face_shards import ShardReader
+from fast_decode import decode_face
+from manifest_store import load_manifest, resolve_manifest, video_keys
+from balanced_sampler import BalancedStreamSampler, dataset_strata
+from clips import pick_clip
+
+# Face crop names written by extract_faces.py ("000_003_frame0042_face0.jpg")
+# and extract_simple.py ("000_003_face1.jpg")
+FACE_FILE_PATTERN = re.compile(r'^(?P<video>.+?)_(?:frame\d+_)?face\d+\.jpg$')
+
+# The cache sits next to the face directory (e.g. extracted_faces/real.face_index.json)
+# so writing it does not change the directory mtime it is validated against
+INDEX_CACHE_SUFFIX = '.face_index.json'
+
+def build_face_index(face_dir):
+    """Map exact video id -> sorted list of face crop file names in face_dir"""
+    index = {}
+    with os.scandir(face_dir) as entries:
+        for entry in entries:
+            match = FACE_FILE_PATTERN.match(entry.name)
+            if match:
+                index.setdefault(match.group('video'), []).append(entry.name)
+    for names in index.values():
+        names.sort()
+    return index
+
+def load_face_index(face_dir, use_cache=True):
+    """Face index for face_dir, reusing the cached copy while the directory is unchanged
+
+    Adding or removing files changes the directory mtime, which invalidates the cache.
+    """
+    if not os.path.isdir(face_dir):
+        return {}
+    
+    cache_path = os.path.normpath(face_dir) + INDEX_CACHE_SUFFIX
+    dir_mtime = os.stat(face_dir).st_mtime_ns
+    
+    if use_cache and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r') as f:
+                cached = json.load(f)
+            if cached.get('mtime_ns') == dir_mtime:
+                return cached['index']
+        except (OSError, ValueError, KeyError):
+            pass
+    
+    index = build_face_index(face_dir)
+    
+    if use_cache:
+        try:
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'mtime_ns': dir_mtime, 'index': index}, f)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"⚠️  Could not write face index cache {cache_path}: {e}")
+    
+    return index
+
 class DeepFakeDataset(Dataset):
-    def __init__(self, manifest_file, transform=None):
+    def __init__(self, manifest_file, transform=None, face_root='../extracted_faces',
+                 face_sampling='first', use_index_cache=True, fast_decode=False,
+                 clip_size=None, clip_sampling='even'):
         self.transform = transform
-        self.samples = []
+        # fast_decode yields uint8 CHW tensors; normalize them per batch with normalize_batch
+        self.fast_decode = fast_decode
+        self.face_root = face_root
+        self.face_sampling = face_sampling
+        # Clip mode: every item is clip_size crops of one video, stacked to (K, C, H, W)
+        self.clip_size = clip_size
+        self.clip_sampling = clip_sampling
+        
+        self.manifest_file = manifest_file
+        self._manifest = None
         
-        # Read manifest file
-        with open(manifest_file, 'r') as f:
-            for line in f:
-                path, label = line.strip().split(',')
-                self.samples.append((path, int(label)))
+        # Index every face crop once, so lookups are a dict access per sample
+        self.face_index = {
+            label_folder: load_face_index(os.path.join(face_root, label_folder), use_index_cache)
+            for label_folder in ('real', 'fake')
+        }
+    
+    @property
+    def manifest(self):
+        # Structured manifest, memory-mapped in each process (legacy CSV manifests are parsed once)
+        if self._manifest is None:
+            self._manifest = load_manifest(self.manifest_file)
+        return self._manifest
+    
+    def __getstate__(self):
+        # Pickling a memory map copies it, let every loader worker map the file itself
+        state = self.__dict__.copy()
+        if isinstance(self._manifest, np.memmap):
+            state['_manifest'] = None
+        return state
     
     def __len__(self):
-        return len(self.samples)
+        return len(self.manifest)
+    
+    def sample(self, idx):
+        """(video path, label) of sample idx"""
+        row = self.manifest[idx]
+        return row['path'].decode(), int(row['label'])
+    
+    def face_files(self, idx):
+        """All face crop paths extracted from the video of sample idx"""
+        row = self.manifest[idx]
+        label_folder = 'real' if row['label'] == 0 else 'fake'
+        names = self.face_index[label_folder].get(row['video_id'].decode(), [])
+        return [os.path.join(self.face_root, label_folder, name) for name in names]
+    
+    def pick_face_file(self, idx):
+        """One face crop path for sample idx (None if the video has none)"""
+        face_files = self.face_files(idx)
+        if not face_files:
+            return None
+        if self.face_sampling == 'random':
+            return random.choice(face_files)
+        return face_files[0]
+    
+    def _blank_image(self):
+        if self.fast_decode:
+            return torch.full((3, 224, 224), 128, dtype=torch.uint8)
+        return Image.new('RGB', (224, 224), color='gray')
+    
+    def _load_image(self, image_path):
+        if self.fast_decode:
+            return decode_face(image_path)
+        return Image.open(image_path).convert('RGB')
+    
+    def _transform_clip(self, images):
+        if self.transform:
+            images = [self.transform(image) for image in images]
+        return torch.stack(images)
+    
+    def _get_clip(self, idx):
+        """(K, C, H, W) crops spread over the video of sample idx"""
+        path, label = self.sample(idx)
+        try:
+            face_files = self.face_files(idx)
+            positions = pick_clip(len(face_files), self.clip_size, self.clip_sampling)
+            if positions:
+                images = [self._load_image(face_files[p]) for p in positions]
+            else:
+                images = [self._blank_image()] * self.clip_size
+            return self._transform_clip(images), label
+        except Exception as e:
+            print(f"Error loading {path}: {e}")
+            return self._transform_clip([self._blank_image()] * self.clip_size), label
     
     def __getitem__(self, idx):
-        path, label = self.samples[idx]
+        if self.clip_size:
+            return self._get_clip(idx)
+        
+        path, label = self.sample(idx)
         
         try:
             # For video paths, we need to handle face images
             if path.endswith('.mp4'):
-                # Convert video path to extracted face path
-                video_name = os.path.splitext(os.path.basename(path))[0]
-                label_folder = 'real' if label == 0 else 'fake'
-                
-                # Look for corresponding face images
-                face_dir = f"../extracted_faces/{label_folder}"
-                if os.path.exists(face_dir):
-                    # Find face images for this video
-                    face_files = [f for f in os.listdir(face_dir) if video_name in f]
-                    if face_files:
-                        # Use the first face image found
-                        image_path = os.path.join(face_dir, face_files[0])
-                        image = Image.open(image_path).convert('RGB')
-                    else:
-                        # Fallback: create a blank image
-                        image = Image.new('RGB', (224, 224), color='gray')
+                # Look up the face crops extracted from this video
+                image_path = self.pick_face_file(idx)
+                if image_path is not None:
+                    image = self._load_image(image_path)
                 else:
-                    image = Image.new('RGB', (224, 224), color='gray')
+                    # Fallback: create a blank image
+                    image = self._blank_image()
             else:
                 # Direct image path
-                image = Image.open(path).convert('RGB')
+                image = self._load_image(path)
             
             if self.transform:
                 image = self.transform(image)
@@ -56,13 +190,94 @@ class DeepFakeDataset(Dataset):
         except Exception as e:
             print(f"Error loading {path}: {e}")
             # Return a dummy image
-            image = Image.new('RGB', (224, 224), color='gray')
+            image = self._blank_image()
             if self.transform:
                 image = self.transform(image)
             return image, label
 
-def get_data_loaders(batch_size=32):
-    # Data transformations
+class FaceShardDataset(Dataset):
+    """One sample per face crop, read directly from extraction shards
+
+    Only crops of videos listed in manifest_file are used, so the usual
+    train/test manifests still define the split. With clip_size every sample
+    is instead clip_size crops of one video, read from the video's contiguous
+    block of its shard in one go.
+    """
+    def __init__(self, shard_dirs, manifest_file, transform=None, fast_decode=False,
+                 clip_size=None, clip_sampling='even'):
+        self.transform = transform
+        self.fast_decode = fast_decode
+        self.clip_size = clip_size
+        self.clip_sampling = clip_sampling
+        self.reader = ShardReader(shard_dirs)
+        
+        # Vectorized join of shard records against the manifest on (method, video_id)
+        manifest = load_manifest(manifest_file)
+        shard_keys = video_keys(self.reader.metadata['method'], self.reader.metadata['video_id'])
+        self.indices = np.flatnonzero(np.isin(shard_keys, video_keys(manifest['method'], manifest['video_id'])))
+        self.labels = self.reader.metadata['label'][self.indices].astype(int)
+        
+        # (start, stop) into indices per video; a video split over two shards counts twice
+        self.clips = None
+        if clip_size:
+            self.clips = self.reader.video_runs(self.indices)
+            self.labels = self.labels[self.clips[:, 0]]
+    
+    def __len__(self):
+        return len(self.clips) if self.clips is not None else len(self.indices)
+    
+    def _get_clip(self, idx):
+        start, stop = self.clips[idx]
+        video_rows = self.indices[start:stop]
+        rows = video_rows[pick_clip(len(video_rows), self.clip_size, self.clip_sampling)]
+        if self.fast_decode:
+            images = self.reader.crop_tensors(rows)
+            if not self.transform:
+                return images, int(self.labels[idx])
+            images = list(images)
+        else:
+            # Shards store OpenCV BGR crops
+            images = [Image.fromarray(crop[:, :, ::-1]) for crop in self.reader.crops(rows)]
+        if self.transform:
+            images = [self.transform(image) for image in images]
+        return torch.stack(images), int(self.labels[idx])
+    
+    def __getitem__(self, idx):
+        if self.clips is not None:
+            return self._get_clip(idx)
+        
+        row = self.indices[idx]
+        if self.fast_decode:
+            image = self.reader.crop_tensor(row)
+        else:
+            crop = self.reader.crop(row)
+            # Shards store OpenCV BGR crops
+            image = Image.fromarray(crop[:, :, ::-1])
+        
+        if self.transform:
+            image = self.transform(image)
+        
+        return image, int(self.labels[idx])
+
+def get_transforms(fast_decode=False, batch_augment=False):
+    """(train_transform, test_transform) used by every loader
+
+    With fast_decode the datasets already yield 224x224 uint8 tensors, so only
+    the augmentations remain; conversion to float and normalization happen
+    once per batch in normalize_batch. batch_augment drops the per-sample
+    augmentations too, they run on the collated batch (see batch_augment.py).
+    """
+    if batch_augment:
+        return None, None
+    
+    if fast_decode:
+        train_transform = transforms.Compose([
+            transforms.RandomHorizontalFlip(),
+            transforms.RandomRotation(10),
+            transforms.ColorJitter(brightness=0.2, contrast=0.2),
+        ])
+        return train_transform, None
+    
     train_transform = transforms.Compose([
         transforms.Resize((224, 224)),
         transforms.RandomHorizontalFlip(),
@@ -80,17 +295,113 @@ def get_data_loaders(batch_size=32):
                            std=[0.229, 0.224, 0.225])
     ])
     
+    return train_transform, test_transform
+
+def get_datasets(train_transform, test_transform, shard_dirs=None, fast_decode=False, clip_size=None):
+    """Train and test datasets from the manifests (or from extraction shards)
+
+    With clip_size, training clips are random faces of each video and test
+    clips are spread evenly over it.
+    """
+    train_manifest = resolve_manifest('train', '../manifests')
+    test_manifest = resolve_manifest('test', '../manifests')
+    train_clips = dict(clip_size=clip_size, clip_sampling='random')
+    test_clips = dict(clip_size=clip_size, clip_sampling='even')
+    if shard_dirs:
+        train_dataset = FaceShardDataset(shard_dirs, train_manifest,
+                                         transform=train_transform, fast_decode=fast_decode, **train_clips)
+        test_dataset = FaceShardDataset(shard_dirs, test_manifest,
+                                        transform=test_transform, fast_decode=fast_decode, **test_clips)
+    else:
+        train_dataset = DeepFakeDataset(train_manifest,
+                                        transform=train_transform, fast_decode=fast_decode, **train_clips)
+        test_dataset = DeepFakeDataset(test_manifest,
+                                       transform=test_transform, fast_decode=fast_decode, **test_clips)
+    return train_dataset, test_dataset
+
+def seed_worker(worker_id):
+    """Seed Python and NumPy in a loader worker from the seed torch gave it
+
+    torch derives each worker's seed from the loader generator, so with a
+    seeded generator every worker gets its own, reproducible stream.
+    """
+    worker_seed = torch.initial_seed() % 2**32
+    np.random.seed(worker_seed)
+    random.seed(worker_seed)
+
+def make_loader(dataset, batch_size, shuffle, num_workers=0, pin_memory=None,
+                prefetch_factor=4, persistent_workers=True, seed=0, sampler=None):
+    """DataLoader with worker processes, prefetching and pinned memory
+
+    num_workers=0 keeps loading in the training process (the old behaviour).
+    pin_memory defaults to on when a GPU is available. A sampler replaces
+    shuffle. Shuffling uses a RandomSampler with its own generator, so the
+    order depends only on that generator's seed, not on when the loader
+    draws worker seeds from loader.generator.
+    """
+    if pin_memory is None:
+        pin_memory = torch.cuda.is_available()
+    
+    generator = torch.Generator()
+    generator.manual_seed(seed)
+    if shuffle and sampler is None:
+        sampler = RandomSampler(dataset, generator=torch.Generator().manual_seed(seed))
+    
+    kwargs = dict(batch_size=batch_size, sampler=sampler,
+                  num_workers=num_workers, pin_memory=pin_memory, worker_init_fn=seed_worker,
+                  generator=generator)
+    if num_workers > 0:
+        kwargs['prefetch_factor'] = prefetch_factor
+        kwargs['persistent_workers'] = persistent_workers
+    return DataLoader(dataset, **kwargs)
+
+def get_data_loaders(batch_size=32, shard_dirs=None, num_workers=0, pin_memory=None,
+                     prefetch_factor=4, persistent_workers=True, fast_decode=False, batch_augment=False,
+                     balanced=None, seed=0, clip_size=None):
+    """Train and test loaders
+
+    num_workers='auto' picks the fastest worker count measured on this host
+    (see loader_autotune.py). fast_decode yields uint8 batches that must go
+    through fast_decode.normalize_batch before the model. batch_augment
+    implies fast_decode and leaves augmentation to a BatchAugment passed to
+    normalize_batch. balanced ('label' or 'label_method') draws training
+    samples from a BalancedStreamSampler instead of shuffling. clip_size
+    turns every sample into a (K, C, H, W) clip of one video (see clips.py).
+    """
+    if batch_augment:
+        fast_decode = True
+    
+    # Data transformations
+    train_transform, test_transform = get_transforms(fast_decode, batch_augment)
+    
     # Create datasets
-    train_dataset = DeepFakeDataset('../manifests/train_manifest.csv', transform=train_transform)
-    test_dataset = DeepFakeDataset('../manifests/test_manifest.csv', transform=test_transform)
+    train_dataset, test_dataset = get_datasets(train_transform, test_transform, shard_dirs, fast_decode,
+                                               clip_size)
+    
+    if num_workers == 'auto':
+        from loader_autotune import autotune_num_workers
+        num_workers = autotune_num_workers(train_dataset, batch_size)
     
     # Create data loaders
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True)
-    test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=False)
+    loader_kwargs = dict(num_workers=num_workers, pin_memory=pin_memory,
+                         prefetch_factor=prefetch_factor, persistent_workers=persistent_workers)
+    sampler = None
+    if balanced:
+        sampler = BalancedStreamSampler(*dataset_strata(train_dataset), balance=balanced, seed=seed)
+    train_loader = make_loader(train_dataset, batch_size, shuffle=True, seed=seed, sampler=sampler,
+                               **loader_kwargs)
+    test_loader = make_loader(test_dataset, batch_size, shuffle=False, seed=seed, **loader_kwargs)
     
     print(f"📊 Dataset stats:")
     print(f"   Training samples: {len(train_dataset)}")
     print(f"   Test samples: {len(test_dataset)}")
+    print(f"   Loader workers: {num_workers}")
+    if clip_size:
+        print(f"   Clip mode: {clip_size} faces per video")
+    if sampler is not None:
+        print(f"   Balanced sampling ({balanced}): " + ", ".join(
+            f"{'real' if s['label'] == 0 else 'fake'}/{s['method']} {s['samples']} @ {s['weight']:.2f}"
+            for s in sampler.stats()))
     
     return train_loader, test_loader
 
@@ -0,0 +1,181 @@
+# model_development/evaluation.py
+import json
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch.utils.data import Subset
+from balanced_sampler import dataset_strata
+from manifest_store import video_keys
+
+LOG_FILE = 'logs/evaluation.jsonl'
+
+
+def sample_metadata(dataset):
+    """(methods, videos) per sample: manipulation method and an integer video id
+
+    Samples of one video share an id, so face-level predictions can be
+    pooled per video. Datasets without metadata (cached features) get one
+    video per sample and an empty method.
+    """
+    if isinstance(dataset, Subset):
+        methods, videos = sample_metadata(dataset.dataset)
+        indices = np.asarray(dataset.indices)
+        return methods[indices], np.unique(videos[indices], return_inverse=True)[1]
+    try:
+        _, methods = dataset_strata(dataset)
+    except TypeError:
+        return np.full(len(dataset), b'', dtype='S1'), np.arange(len(dataset))
+    if hasattr(dataset, 'reader') and getattr(dataset, 'clips', None) is None:
+        # One sample per crop: crops of the same (method, video_id) are one video
+        metadata = dataset.reader.metadata[dataset.indices]
+        videos = np.unique(video_keys(metadata['method'], metadata['video_id']), return_inverse=True)[1]
+        return np.asarray(methods), videos.reshape(-1)
+    # Manifest datasets and clips are one sample per video already
+    return np.asarray(methods), np.arange(len(methods))
+
+
+class EvalAccumulator:
+    """Logits and labels of one evaluation pass, written into preallocated device tensors
+
+    add() only copies a batch into place, nothing is synchronized until
+    results() moves everything to the CPU once.
+    """
+
+    def __init__(self, num_samples, device, num_classes=2):
+        self.logits = torch.empty(num_samples, num_classes, device=device)
+        self.labels = torch.empty(num_samples, dtype=torch.long, device=device)
+        self.count = 0
+
+    def add(self, logits, labels):
+        end = self.count + labels.size(0)
+        self.logits[self.count:end] = logits.detach().float()
+        self.labels[self.count:end] = labels
+        self.count = end
+
+    def results(self, methods=None, videos=None):
+        logits, labels = self.logits[:self.count].cpu(), self.labels[:self.count].cpu()
+        if methods is not None:
+            methods, videos = methods[:self.count], videos[:self.count]
+        return compute_metrics(logits, labels, methods, videos)
+
+
+def roc_curve(scores, labels):
+    """(fpr, tpr, thresholds) for scores where higher means label 1, one point per distinct score"""
+    order = torch.argsort(scores, descending=True)
+    scores, labels = scores[order], labels[order].double()
+    tps = torch.cumsum(labels, 0)
+    fps = torch.cumsum(1 - labels, 0)
+    # Last position of every run of equal scores
+    ends = torch.cat([torch.nonzero(scores[1:] != scores[:-1]).flatten(), torch.tensor([len(scores) - 1])])
+    tps, fps, thresholds = tps[ends], fps[ends], scores[ends]
+    zero = torch.zeros(1, dtype=torch.float64)
+    tpr = torch.cat([zero, tps / tps[-1].clamp(min=1)])
+    fpr = torch.cat([zero, fps / fps[-1].clamp(min=1)])
+    return fpr, tpr, torch.cat([torch.tensor([float('inf')]), thresholds.double()])
+
+
+def pr_curve(scores, labels):
+    """(precision, recall, average precision) over the distinct score thresholds"""
+    order = torch.argsort(scores, descending=True)
+    scores, labels = scores[order], labels[order].double()
+    tps = torch.cumsum(labels, 0)
+    ends = torch.cat([torch.nonzero(scores[1:] != scores[:-1]).flatten(), torch.tensor([len(scores) - 1])])
+    tps = tps[ends]
+    precision = tps / (ends + 1).double()
+    recall = tps / tps[-1].clamp(min=1)
+    average_precision = torch.sum(torch.diff(recall, prepend=torch.zeros(1, dtype=torch.float64)) * precision)
+    return precision, recall, float(average_precision)
+
+
+def equal_error_rate(fpr, tpr, thresholds):
+    """(EER, threshold) where false positive and false negative rates cross"""
+    fnr = 1 - tpr
+    idx = int(torch.argmin(torch.abs(fnr - fpr)))
+    return float((fpr[idx] + fnr[idx]) / 2), float(thresholds[idx])
+
+
+def _binary_metrics(scores, labels):
+    """AUC, EER and AP of P(fake) scores; NaN when only one class is present"""
+    if labels.numel() == 0 or labels.min() == labels.max():
+        return {'auc': float('nan'), 'eer': float('nan'), 'eer_threshold': float('nan'),
+                'average_precision': float('nan')}
+    fpr, tpr, thresholds = roc_curve(scores, labels)
+    eer, eer_threshold = equal_error_rate(fpr, tpr, thresholds)
+    _, _, average_precision = pr_curve(scores, labels)
+    return {'auc': float(torch.trapz(tpr, fpr)), 'eer': eer, 'eer_threshold': eer_threshold,
+            'average_precision': average_precision}
+
+
+def compute_metrics(logits, labels, methods=None, videos=None):
+    """Loss, accuracy, ROC/PR summaries, confusion matrix, per-method and per-video metrics
+
+    Label 1 is fake, so the score is the softmax probability of class 1.
+    """
+    scores = torch.softmax(logits, 1)[:, 1]
+    predicted = logits.argmax(1)
+    correct = predicted.eq(labels)
+    results = {
+        'samples': labels.numel(),
+        'loss': float(F.cross_entropy(logits, labels)) if labels.numel() else float('nan'),
+        'accuracy': 100. * float(correct.double().mean()) if labels.numel() else float('nan'),
+        # rows: true real/fake, columns: predicted real/fake
+        'confusion': torch.bincount(labels * 2 + predicted, minlength=4).view(2, 2).tolist(),
+    }
+    results.update(_binary_metrics(scores, labels))
+    results['curves'] = {'scores': scores, 'labels': labels}
+
+    if methods is not None and len(methods):
+        names, codes = np.unique(methods, return_inverse=True)
+        codes = torch.from_numpy(codes.reshape(-1))
+        counts = torch.bincount(codes, minlength=len(names))
+        hits = torch.bincount(codes, weights=correct.double(), minlength=len(names))
+        results['per_method'] = {
+            (name.decode() if isinstance(name, bytes) else str(name)) or 'all':
+                {'samples': int(count), 'accuracy': 100. * float(hit) / max(int(count), 1)}
+            for name, count, hit in zip(names, counts, hits)
+        }
+
+    if videos is not None and len(videos) and int(videos.max()) + 1 < len(videos):
+        # Average P(fake) over each video's samples, like inference's "mean" aggregation
+        codes = torch.from_numpy(np.asarray(videos, dtype=np.int64))
+        counts = torch.bincount(codes).double()
+        video_scores = torch.bincount(codes, weights=scores.double()) / counts
+        video_labels = torch.zeros(len(counts), dtype=torch.long).scatter_(0, codes, labels)
+        video = {'videos': len(counts),
+                 'accuracy': 100. * float(((video_scores >= 0.5).long() == video_labels).double().mean())}
+        video.update(_binary_metrics(video_scores, video_labels))
+        results['video'] = video
+    return results
+
+
+def log_results(writer, tag, results, step, log_file=LOG_FILE):
+    """Write results to TensorBoard under tag and append them (without curves) to log_file"""
+    names = {'loss': 'Loss', 'accuracy': 'Accuracy', 'auc': 'AUC', 'eer': 'EER',
+             'average_precision': 'Average Precision'}
+    for key, name in names.items():
+        if not np.isnan(results[key]):
+            writer.add_scalar(f'{tag} {name}', results[key], step)
+    for method, row in results.get('per_method', {}).items():
+        writer.add_scalar(f'{tag} Method Accuracy/{method}', row['accuracy'], step)
+    video = results.get('video')
+    if video is not None:
+        writer.add_scalar(f'{tag} Video Accuracy', video['accuracy'], step)
+        if not np.isnan(video['auc']):
+            writer.add_scalar(f'{tag} Video AUC', video['auc'], step)
+    curves = results['curves']
+    if curves['labels'].numel():
+        writer.add_pr_curve(f'{tag} PR', curves['labels'], curves['scores'], step)
+
+    if log_file:
+        record = {key: value for key, value in results.items() if key != 'curves'}
+        record.update(tag=tag, step=step)
+        with open(log_file, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+
+def fixed_subsample(dataset, size, seed=0):
+    """Subset of size samples drawn once with seed, so every quick evaluation scores the same samples"""
+    if size >= len(dataset):
+        return dataset
+    indices = np.sort(np.random.default_rng(seed).choice(len(dataset), size=size, replace=False))
+    return Subset(dataset, indices.tolist())
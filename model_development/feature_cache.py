@@ -0,0 +1,169 @@
+# model_development/feature_cache.py
+import os
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+import torch
+from torch.utils.data import Dataset, DataLoader
+from data_loader import get_transforms, get_datasets, make_loader
+from balanced_sampler import BalancedStreamSampler, dataset_strata
+from fast_decode import normalize_batch
+from checkpointing import base_fingerprint
+
+CACHE_ROOT = 'feature_cache'
+
+
+def fingerprint(model, transform, dataset):
+    """Hash of everything the cached features depend on
+
+    Frozen backbone weights, the preprocessing pipeline, the exact list of
+    samples and the crops behind them. Changing any of them, re-extracting
+    faces included, yields a different cache directory.
+    """
+    digest = hashlib.sha1()
+    digest.update(base_fingerprint(model).encode())
+    digest.update(repr(transform).encode())
+    digest.update(type(dataset).__name__.encode())
+    digest.update(repr(getattr(dataset, 'face_sampling', None)).encode())
+    if hasattr(dataset, 'manifest'):
+        digest.update(np.ascontiguousarray(dataset.manifest['path']).tobytes())
+        digest.update(np.ascontiguousarray(dataset.manifest['label']).tobytes())
+        # Crop files are overwritten in place on re-extraction, so their stats count, not just their names
+        for idx in range(len(dataset)):
+            for path in dataset.face_files(idx):
+                try:
+                    stat = os.stat(path)
+                    digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+                except OSError:
+                    digest.update(f"{path}:missing".encode())
+    elif hasattr(dataset, 'indices'):
+        digest.update(np.asarray(dataset.indices).tobytes())
+    if hasattr(dataset, 'reader'):
+        # Index records (offsets included) of the crops used; re-extraction appends new records
+        rows = np.asarray(dataset.indices)
+        digest.update(np.ascontiguousarray(dataset.reader.metadata[rows]).tobytes())
+        digest.update(np.ascontiguousarray(dataset.reader.shard_ids[rows]).tobytes())
+        digest.update('\n'.join(dataset.reader.data_paths).encode())
+    return digest.hexdigest()[:16]
+
+
+class FeatureDataset(Dataset):
+    """Penultimate backbone features of a dataset, read from a memory-mapped .npy file"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.labels = np.load(os.path.join(cache_dir, 'labels.npy'))
+        self._features = None
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def features(self):
+        # Opened lazily so every DataLoader worker maps the file itself
+        if self._features is None:
+            self._features = np.load(os.path.join(self.cache_dir, 'features.npy'), mmap_mode='r')
+        return self._features
+
+    def __getitem__(self, idx):
+        return torch.from_numpy(np.array(self.features[idx])), int(self.labels[idx])
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_features'] = None
+        return state
+
+
+def build_feature_cache(model, dataset, transform, device, name, cache_root=CACHE_ROOT, batch_size=64):
+    """Run the frozen backbone once over dataset and store its features
+
+    Returns the cache directory; an existing complete cache with the same
+    fingerprint is reused, stale caches of the same name are removed.
+    """
+    key = fingerprint(model, transform, dataset)
+    cache_dir = os.path.join(cache_root, f'{name}-{key}')
+    meta_path = os.path.join(cache_dir, 'meta.json')
+
+    if os.path.exists(meta_path):
+        print(f"♻️  Using cached {name} features: {cache_dir}")
+        return cache_dir
+
+    # Anything else under this name was built from other weights or preprocessing
+    if os.path.isdir(cache_root):
+        for entry in os.listdir(cache_root):
+            if entry.startswith(f'{name}-') and entry != os.path.basename(cache_dir):
+                shutil.rmtree(os.path.join(cache_root, entry), ignore_errors=True)
+                print(f"🗑️  Removed stale feature cache: {entry}")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    print(f"🧮 Caching {name} features for {len(dataset)} samples...")
+    start_time = time.time()
+
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=False)
+    features = None
+    labels = np.zeros(len(dataset), dtype=np.int64)
+    offset = 0
+
+    was_training = model.training
+    model.eval()
+    with torch.no_grad():
+        for images, batch_labels in loader:
+            batch = model.extract_features(normalize_batch(images, device)).cpu().numpy()
+            if features is None:
+                features = np.lib.format.open_memmap(
+                    os.path.join(cache_dir, 'features.npy'), mode='w+',
+                    dtype=np.float32, shape=(len(dataset), batch.shape[1]))
+            features[offset:offset + len(batch)] = batch
+            labels[offset:offset + len(batch)] = np.asarray(batch_labels)
+            offset += len(batch)
+    model.train(was_training)
+
+    if features is not None:
+        features.flush()
+        del features
+    np.save(os.path.join(cache_dir, 'labels.npy'), labels)
+
+    # meta.json is written last and marks the cache as complete
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump({'samples': len(dataset), 'transform': repr(transform), 'key': key}, f, indent=2)
+    os.replace(meta_path + '.tmp', meta_path)
+
+    print(f"✅ Cached {name} features in {time.time() - start_time:.1f}s")
+    return cache_dir
+
+
+def get_feature_loaders(model, device, batch_size=32, shard_dirs=None, cache_root=CACHE_ROOT, balanced=None,
+                        seed=0, num_workers=0):
+    """Data loaders yielding (features, label) instead of (image, label)
+
+    Features are computed with the deterministic test preprocessing, so the
+    head is trained without the random image augmentations. Cached rows keep
+    the dataset order, so balanced sampling uses the dataset's strata.
+    num_workers works as in data_loader.get_data_loaders, 'auto' included.
+    """
+    _, test_transform = get_transforms()
+    train_dataset, test_dataset = get_datasets(test_transform, test_transform, shard_dirs)
+
+    train_dir = build_feature_cache(model, train_dataset, test_transform, device, 'train', cache_root)
+    test_dir = build_feature_cache(model, test_dataset, test_transform, device, 'test', cache_root)
+
+    train_features, test_features = FeatureDataset(train_dir), FeatureDataset(test_dir)
+    if num_workers == 'auto':
+        from loader_autotune import autotune_num_workers
+        num_workers = autotune_num_workers(train_features, batch_size)
+
+    sampler = None
+    if balanced:
+        sampler = BalancedStreamSampler(*dataset_strata(train_dataset), balance=balanced, seed=seed)
+    train_loader = make_loader(train_features, batch_size, shuffle=True, num_workers=num_workers, seed=seed,
+                               sampler=sampler)
+    test_loader = make_loader(test_features, batch_size, shuffle=False, num_workers=num_workers, seed=seed)
+
+    print(f"📊 Feature cache stats:")
+    print(f"   Training samples: {len(train_loader.dataset)}")
+    print(f"   Test samples: {len(test_loader.dataset)}")
+    print(f"   Loader workers: {num_workers}")
+
+    return train_loader, test_loader
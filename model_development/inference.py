@@ -0,0 +1,345 @@
+# model_development/inference.py
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import cv2
+import numpy as np
+import torch
+
+# Shared extraction modules (fast_decode, frame_sampler, face_detector) live in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model import create_model, model_skeleton
+from checkpointing import is_delta, load_model_state, base_dir_for
+from fast_decode import normalize_batch
+from score_cache import ScoreCache, file_hash
+from frame_sampler import plan_frame_indices, iter_sampled_frames
+from face_detector import PRESETS, FaceDetector, crop_face
+
+CHECKPOINT = 'checkpoints/best_model.pth'
+AGGREGATIONS = ('mean', 'max', 'trimmed_mean')
+
+# Models already loaded in this process, keyed by (checkpoint path, device)
+_loaded_models = {}
+
+
+def load_detector(checkpoint_path=CHECKPOINT, device=torch.device('cpu')):
+    """Trained DeepFakeDetector in eval mode, loaded at most once per process"""
+    key = (os.path.abspath(checkpoint_path), str(device))
+    model = _loaded_models.get(key)
+    if model is None:
+        checkpoint = torch.load(checkpoint_path, map_location=device)
+        # Checkpoints from before the backbone registry are all VGG19
+        backbone = checkpoint.get('backbone', 'vgg19')
+        if is_delta(checkpoint):
+            # Frozen weights are mapped from the shared base file, nothing is built or downloaded
+            base_dir = base_dir_for(checkpoint_path)
+            model = load_model_state(model_skeleton(backbone), checkpoint, base_dir).to(device)
+        else:
+            # Full checkpoints hold every weight, no pretrained file needed
+            model = create_model(device, pretrained=False, backbone=backbone)
+            load_model_state(model, checkpoint)
+        model.eval()
+        _loaded_models[key] = model
+    return model
+
+
+def find_videos(inputs):
+    """Expand files and directories into a sorted list of .mp4 paths"""
+    videos = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                videos.extend(os.path.join(root, f) for f in files if f.endswith('.mp4'))
+        else:
+            videos.append(item)
+    return sorted(videos)
+
+
+def read_sampled_frames(video_path, frames_per_video=10):
+    """[(frame_idx, frame)] decoded with the shared frame sampler"""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            return []
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        return list(iter_sampled_frames(cap, plan_frame_indices(total_frames, frames_per_video)))
+    finally:
+        cap.release()
+
+
+def detect_faces(frames, detector):
+    """[(frame_idx, box, crop)] for every face in frames of one video, crops as in extraction"""
+    faces = []
+    detector.reset()
+    for frame_idx, frame in frames:
+        for box in detector.detect(frame):
+            crop = crop_face(frame, box)
+            if crop is not None:
+                faces.append((frame_idx, box, crop))
+    return faces
+
+
+def sample_video_faces(video_path, detector, frames_per_video=10):
+    """[(frame_idx, box, crop)] for every face on the sampled frames of a video"""
+    return detect_faces(read_sampled_frames(video_path, frames_per_video), detector)
+
+
+def crops_to_tensor(crops):
+    """List of BGR HxWx3 crops -> RGB uint8 NCHW tensor"""
+    batch = np.stack(crops)[:, :, :, ::-1].transpose(0, 3, 1, 2)
+    return torch.from_numpy(np.ascontiguousarray(batch))
+
+
+def aggregate_logits(logits, method='mean', trim=0.1):
+    """Per-video fake probability from per-face logits (N x 2)
+
+    Aggregates the fake-vs-real logit margin, then maps it through a sigmoid.
+    """
+    if len(logits) == 0:
+        return None
+    margins = (logits[:, 1] - logits[:, 0]).float()
+    if method == 'max':
+        margin = margins.max()
+    elif method == 'trimmed_mean':
+        ordered = margins.sort().values
+        cut = int(len(ordered) * trim)
+        if len(ordered) - 2 * cut > 0:
+            ordered = ordered[cut:len(ordered) - cut]
+        margin = ordered.mean()
+    elif method == 'mean':
+        margin = margins.mean()
+    else:
+        raise ValueError(f"Unknown aggregation: {method} (choose from {', '.join(AGGREGATIONS)})")
+    return torch.sigmoid(margin).item()
+
+
+def make_result(video_path, logits, num_faces, aggregate, threshold=0.5):
+    score = aggregate_logits(logits, aggregate) if num_faces else None
+    return {
+        'video': video_path,
+        'score': score,
+        'prediction': None if score is None else ('fake' if score >= threshold else 'real'),
+        'faces': num_faces,
+        'aggregate': aggregate,
+    }
+
+
+class VideoScorer:
+    """Scores videos end to end: sampling, cascade detection, batched VGG19 forward
+
+    Crops from consecutive videos share forward passes, so small videos do
+    not waste a whole batch each. With a ScoreCache, videos seen before skip
+    decoding and detection (faces hit) or everything (logits hit).
+    """
+
+    def __init__(self, checkpoint=CHECKPOINT, device=None, batch_size=64, frames_per_video=10,
+                 detector_preset='accurate', aggregate='mean', cache=None):
+        if aggregate not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation: {aggregate} (choose from {', '.join(AGGREGATIONS)})")
+        self.device = device or torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        self.model = load_detector(checkpoint, self.device)
+        self.checkpoint = checkpoint
+        self.batch_size = batch_size
+        self.frames_per_video = frames_per_video
+        self.aggregate = aggregate
+        self.detector = FaceDetector(detector_preset)
+        self.cache = cache
+        self.checkpoint_hash = file_hash(checkpoint) if cache is not None else None
+
+        self.videos_scored = 0
+        self.faces_scored = 0
+        self.seconds = 0.0
+
+    def cache_keys(self, video_path):
+        """Cache keys of one video, None when caching is off or the file is unreadable"""
+        if self.cache is None:
+            return None
+        return self.cache.keys_for(video_path, self.frames_per_video, self.detector.preset, self.checkpoint_hash)
+
+    def cached_logits(self, keys):
+        """Per-face logits of a video scored before with this checkpoint, or None"""
+        if keys is None:
+            return None
+        logits = self.cache.get_logits(keys)
+        return None if logits is None else torch.from_numpy(logits)
+
+    def extract_faces(self, video_path, keys=None, detector=None):
+        """[(frame_idx, box, crop)] of one video, None if no frame could be decoded
+
+        Pass a detector when calling from several threads. Unreadable videos
+        are not cached, a later attempt may succeed.
+        """
+        if keys is not None:
+            faces = self.cache.get_faces(keys)
+            if faces is not None:
+                return faces
+        start = time.perf_counter()
+        frames = read_sampled_frames(video_path, self.frames_per_video)
+        if not frames:
+            return None
+        faces = detect_faces(frames, detector or self.detector)
+        if keys is not None:
+            self.cache.put_faces(keys, faces, time.perf_counter() - start)
+        return faces
+
+    def predict(self, images):
+        """Logits for a uint8 NCHW batch, in chunks of batch_size"""
+        outputs = []
+        with torch.no_grad():
+            for start in range(0, len(images), self.batch_size):
+                batch = normalize_batch(images[start:start + self.batch_size], self.device)
+                outputs.append(self.model(batch).float().cpu())
+        return torch.cat(outputs) if outputs else torch.zeros(0, 2)
+
+    def score_videos(self, video_paths):
+        """Yield one result dict per video, in input order"""
+        start_time = time.perf_counter()
+        pending = []       # crops waiting for a forward pass
+        owners = []        # index into videos for each pending crop
+        videos = []        # [path, crop count, list of logit tensors, cache keys, seconds spent]
+        next_to_yield = 0
+
+        def flush(force):
+            nonlocal pending, owners
+            while pending and (force or len(pending) >= self.batch_size):
+                take = len(pending) if force else self.batch_size
+                logits = self.predict(crops_to_tensor(pending[:take]))
+                batch_owners = torch.tensor(owners[:take])
+                for owner in batch_owners.unique().tolist():
+                    videos[owner][2].append(logits[batch_owners == owner])
+                pending, owners = pending[take:], owners[take:]
+
+        for video_path in video_paths:
+            keys = self.cache_keys(video_path)
+            logits = self.cached_logits(keys)
+            if logits is not None:
+                videos.append([video_path, len(logits), [logits], None, 0.0])
+                faces = []
+            else:
+                video_start = time.perf_counter()
+                faces = self.extract_faces(video_path, keys)
+                if faces is None:
+                    print(f"❌ Could not decode {video_path}")
+                    faces, keys = [], None
+                videos.append([video_path, len(faces), [], keys, time.perf_counter() - video_start])
+            for _, _, crop in faces:
+                pending.append(crop)
+                owners.append(len(videos) - 1)
+            flush(force=False)
+
+            # Every video before the oldest pending crop is complete
+            oldest_pending = owners[0] if owners else len(videos)
+            while next_to_yield < oldest_pending:
+                yield self._finish(videos, next_to_yield, start_time)
+                next_to_yield += 1
+
+        flush(force=True)
+        while next_to_yield < len(videos):
+            yield self._finish(videos, next_to_yield, start_time)
+            next_to_yield += 1
+
+    def _finish(self, videos, idx, start_time):
+        path, num_faces, chunks, keys, seconds = videos[idx]
+        videos[idx] = None  # free the logits of finished videos
+        logits = torch.cat(chunks) if chunks else torch.zeros(0, 2)
+        if keys is not None:
+            self.cache.put_logits(keys, logits.numpy(), seconds)
+        self.videos_scored += 1
+        self.faces_scored += num_faces
+        self.seconds = time.perf_counter() - start_time
+        return make_result(path, logits, num_faces, self.aggregate)
+
+    def stats(self):
+        stats = {
+            'videos': self.videos_scored,
+            'faces': self.faces_scored,
+            'seconds': self.seconds,
+            'videos_per_sec': self.videos_scored / self.seconds if self.seconds > 0 else 0.0,
+            'faces_per_sec': self.faces_scored / self.seconds if self.seconds > 0 else 0.0,
+        }
+        if self.cache is not None:
+            stats['cache'] = self.cache.stats()
+        return stats
+
+
+def write_results(results, output_path):
+    """Stream result dicts to .jsonl or .csv (chosen by extension)"""
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    fields = ['video', 'score', 'prediction', 'faces', 'aggregate']
+    with open(output_path, 'w', newline='') as f:
+        writer = None
+        if output_path.endswith('.csv'):
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+            writer.writeheader()
+        for result in results:
+            if writer is not None:
+                writer.writerow(result)
+            else:
+                f.write(json.dumps(result) + '\n')
+            f.flush()
+            yield result
+
+
+def add_scoring_arguments(parser):
+    parser.add_argument("inputs", nargs="+", help=".mp4 files or directories to scan")
+    parser.add_argument("--checkpoint", default=CHECKPOINT)
+    parser.add_argument("--output", default="scores.jsonl", help="results file, .jsonl or .csv")
+    parser.add_argument("--batch-size", type=int, default=64, help="faces per model forward pass")
+    parser.add_argument("--frames-per-video", type=int, default=10)
+    parser.add_argument("--detector-preset", choices=list(PRESETS), default="accurate")
+    parser.add_argument("--aggregate", choices=AGGREGATIONS, default="mean")
+    add_cache_arguments(parser)
+
+
+def add_cache_arguments(parser):
+    parser.add_argument("--cache-dir", help="persistent score cache shared by all scoring processes (off by default)")
+    parser.add_argument("--cache-max-gb", type=float, default=10.0, help="evict least recently used entries past this")
+    parser.add_argument("--no-cache-crops", action="store_true", help="cache only logits, not face crops")
+
+
+def cache_from_args(args):
+    if not args.cache_dir:
+        return None
+    return ScoreCache(args.cache_dir, int(args.cache_max_gb * (1 << 30)), store_crops=not args.no_cache_crops)
+
+
+def report(stats):
+    print(f"\n🎉 Scored {stats['videos']} videos ({stats['faces']} faces) in {stats['seconds']:.1f}s")
+    print(f"⏱️  {stats['videos_per_sec']:.2f} videos/sec, {stats['faces_per_sec']:.1f} faces/sec")
+    if 'cache' in stats:
+        cache = stats['cache']
+        session = cache['session']
+        print(f"💾 Cache: {100 * session['logits_hit_rate']:.1f}% score hits, "
+              f"{100 * session['faces_hit_rate']:.1f}% face hits, "
+              f"{session['bytes_saved'] / (1 << 20):.1f} MiB of video not re-read, "
+              f"{session['seconds_saved']:.1f}s saved")
+        print(f"   {cache['entries']} entries, {cache['bytes'] / (1 << 30):.2f}/{cache['max_bytes'] / (1 << 30):.2f} GiB, "
+              f"lifetime score hit rate {100 * cache['lifetime']['logits_hit_rate']:.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score videos as real or fake with a trained checkpoint")
+    add_scoring_arguments(parser)
+    args = parser.parse_args()
+
+    print("🔍 Deepfake Video Scoring")
+    print("=" * 50)
+    videos = find_videos(args.inputs)
+    print(f"📹 {len(videos)} videos")
+
+    scorer = VideoScorer(args.checkpoint, batch_size=args.batch_size, frames_per_video=args.frames_per_video,
+                         detector_preset=args.detector_preset, aggregate=args.aggregate,
+                         cache=cache_from_args(args))
+    for result in write_results(scorer.score_videos(videos), args.output):
+        score = 'no face' if result['score'] is None else f"{result['score']:.3f} ({result['prediction']})"
+        print(f"   {os.path.basename(result['video'])}: {score}")
+
+    report(scorer.stats())
+    print(f"📁 Results: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
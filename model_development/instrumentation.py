@@ -0,0 +1,159 @@
+# model_development/instrumentation.py
+import os
+import time
+import resource
+from contextlib import contextmanager, nullcontext
+import torch
+
+STAGES = ('data', 'transfer', 'forward', 'backward', 'optimizer')
+PROFILE_DIR = 'logs/profile'
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def parse_steps(text):
+    """'START:END' -> (start, end) global steps for the profiler window"""
+    start, end = (int(part) for part in text.split(':'))
+    if not 0 <= start < end:
+        raise ValueError(f"Profile window must be START:END with 0 <= START < END, got {text}")
+    return start, end
+
+
+class StepMetrics:
+    """Per-stage timing and running loss/accuracy for Trainer.train_epoch
+
+    Stage wall time is measured on the host. On CUDA, events around every
+    stage also give device time, which is where asynchronous kernels
+    actually spend theirs. Loss and correct predictions accumulate in
+    device tensors. The only sync is at every log_every-th step (and at the
+    end of the epoch), where everything goes to the SummaryWriter at once.
+    profile_steps=(start, end) records a torch.profiler trace of those
+    global steps into logs/profile for TensorBoard.
+    """
+
+    def __init__(self, writer, device, log_every=10, profile_steps=None, profile_dir=PROFILE_DIR):
+        self.writer = writer
+        self.device = device
+        self.log_every = log_every
+        self.profile_steps = profile_steps
+        self.profile_dir = profile_dir
+        self.use_events = device.type == 'cuda'
+        self.global_step = 0
+        self._profiler = None
+
+    def start_epoch(self, epoch, steps_per_epoch):
+        self.epoch = epoch
+        self.steps_per_epoch = steps_per_epoch
+        self.global_step = epoch * steps_per_epoch
+        self.batch_idx = 0
+        self.loss_sum = torch.zeros((), device=self.device)
+        self.correct = torch.zeros((), dtype=torch.long, device=self.device)
+        self.samples = 0
+        self._logged = (0.0, 0, 0, 0)   # loss, correct, samples, steps at the last log
+        self._reset_window()
+
+    def _reset_window(self):
+        self.host = dict.fromkeys(STAGES, 0.0)
+        self.events = []
+        self.window_start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        annotate = torch.profiler.record_function(name) if self._profiler is not None else nullcontext()
+        with annotate:
+            if self.use_events and name != 'data':
+                start_event, end_event = torch.cuda.Event(enable_timing=True), torch.cuda.Event(enable_timing=True)
+                start_event.record()
+            start = time.perf_counter()
+            yield
+            self.host[name] += time.perf_counter() - start
+            if self.use_events and name != 'data':
+                end_event.record()
+                self.events.append((name, start_event, end_event))
+
+    def timed(self, loader):
+        """Iterate loader, timing every wait for the next batch as the 'data' stage"""
+        iterator = iter(loader)
+        while True:
+            self._profile_window()
+            with self.stage('data'):
+                try:
+                    batch = next(iterator)
+                except StopIteration:
+                    return
+            yield batch
+
+    def step(self, loss, outputs, labels):
+        """Account one finished optimizer step, without synchronizing"""
+        self.loss_sum += loss.detach().float()
+        self.correct += outputs.detach().argmax(1).eq(labels).sum()
+        self.samples += labels.size(0)
+        self.batch_idx += 1
+        self.global_step += 1
+        if self.batch_idx % self.log_every == 0:
+            self.log()
+
+    def _profile_window(self):
+        if self.profile_steps is None:
+            return
+        start, end = self.profile_steps
+        if self._profiler is None and start <= self.global_step < end:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if self.use_events:
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            os.makedirs(self.profile_dir, exist_ok=True)
+            self._profiler = torch.profiler.profile(
+                activities=activities, record_shapes=True, profile_memory=True,
+                on_trace_ready=torch.profiler.tensorboard_trace_handler(self.profile_dir))
+            self._profiler.start()
+            print(f"🔬 Profiling steps {self.global_step}-{end - 1} -> {self.profile_dir}")
+        elif self._profiler is not None and self.global_step >= end:
+            self.stop_profiler()
+
+    def stop_profiler(self):
+        if self._profiler is not None:
+            self._profiler.stop()
+            self._profiler = None
+
+    def log(self):
+        """Sync once, then write the window since the last log to TensorBoard"""
+        loss_sum, correct = torch.stack([self.loss_sum, self.correct.float()]).tolist()
+        last_loss, last_correct, last_samples, last_steps = self._logged
+        steps = self.batch_idx - last_steps
+        if steps == 0:
+            return
+        samples = self.samples - last_samples
+        elapsed = time.perf_counter() - self.window_start
+        self._logged = (loss_sum, correct, self.samples, self.batch_idx)
+
+        step = self.global_step
+        loss = (loss_sum - last_loss) / steps
+        self.writer.add_scalar('Step/Loss', loss, step)
+        self.writer.add_scalar('Step/Accuracy', 100. * (correct - last_correct) / samples, step)
+        self.writer.add_scalar('Throughput/Samples per sec', samples / elapsed, step)
+        data_fraction = self.host['data'] / elapsed
+        self.writer.add_scalar('Throughput/Data wait fraction', data_fraction, step)
+        for name, seconds in self.host.items():
+            self.writer.add_scalar(f'Stage ms/{name}', 1000 * seconds / steps, step)
+        if self.events:
+            device_ms = dict.fromkeys(STAGES[1:], 0.0)
+            for name, start_event, end_event in self.events:
+                device_ms[name] += start_event.elapsed_time(end_event)
+            for name, ms in device_ms.items():
+                self.writer.add_scalar(f'Device ms/{name}', ms / steps, step)
+            self.writer.add_scalar('Memory/Peak CUDA MB', torch.cuda.max_memory_allocated(self.device) / 2**20, step)
+        self.writer.add_scalar('Memory/Peak RSS MB', peak_rss_mb(), step)
+
+        print(f'Epoch: {self.epoch} | Batch: {self.batch_idx}/{self.steps_per_epoch} | Loss: {loss:.4f} | '
+              f'{samples / elapsed:.1f} samples/s | data wait {data_fraction:.0%}')
+        self._reset_window()
+
+    def end_epoch(self):
+        """(mean batch loss, accuracy %) of the epoch"""
+        self.log()
+        self.stop_profiler()
+        loss_sum, correct = torch.stack([self.loss_sum, self.correct.float()]).tolist()
+        return loss_sum / max(self.batch_idx, 1), 100. * correct / max(self.samples, 1)
@@ -0,0 +1,98 @@
+# model_development/load_generator.py
+import json
+import time
+import asyncio
+import argparse
+import cv2
+import numpy as np
+
+print("📈 Scoring Service Load Generator")
+print("=" * 50)
+
+
+def synthetic_face_jpeg(seed=0):
+    """A 224x224 JPEG with face-like smooth structure, so decode cost is realistic"""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, size=(28, 28, 3), dtype=np.uint8)
+    image = cv2.resize(small, (224, 224), interpolation=cv2.INTER_LINEAR)
+    ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    return encoded.tobytes()
+
+
+async def request(reader, writer, host, method, path, body=b''):
+    writer.write(f'{method} {path} HTTP/1.1\r\nHost: {host}\r\n'
+                 f'Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n'.encode() + body)
+    await writer.drain()
+    status_line = await reader.readline()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    payload = await reader.readexactly(int(headers.get('content-length', 0)))
+    return int(status_line.split()[1]), payload
+
+
+async def client(host, port, path, body, deadline, latencies, errors):
+    """One keep-alive connection sending requests back to back until the deadline"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, host, 'POST', path, body)
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run(host, port, path, body, concurrency, duration):
+    latencies, errors = [], []
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(client(host, port, path, body, deadline, latencies, errors)
+                           for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, metrics = await request(reader, writer, host, 'GET', '/metrics')
+    writer.close()
+    return latencies, errors, elapsed, json.loads(metrics)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure sustained RPS of the local scoring service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32],
+                        help="number of concurrent connections, one run per value")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per run")
+    parser.add_argument("--video", help="send this .mp4 to /score/video instead of a synthetic face")
+    args = parser.parse_args()
+
+    if args.video:
+        path = '/score/video'
+        with open(args.video, 'rb') as f:
+            body = f.read()
+    else:
+        path = '/score/image'
+        body = synthetic_face_jpeg()
+
+    print(f"{'conns':>6} {'requests':>9} {'RPS':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for concurrency in args.concurrency:
+        latencies, errors, elapsed, metrics = asyncio.run(
+            run(args.host, args.port, path, body, concurrency, args.duration))
+        lat_ms = np.array(latencies) * 1000.0 if latencies else np.zeros(1)
+        print(f"{concurrency:>6} {len(latencies):>9} {len(latencies) / elapsed:>8.1f} "
+              f"{np.percentile(lat_ms, 50):>8.1f} {np.percentile(lat_ms, 99):>8.1f} {len(errors):>7}")
+
+    print(f"\n📊 Server batch sizes: {metrics['batch_size_histogram']}")
+    print(f"   Server latency p50/p99: {metrics['latency_ms']['p50']:.1f} / {metrics['latency_ms']['p99']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# model_development/loader_autotune.py
+import os
+import json
+import time
+import socket
+from data_loader import get_transforms, get_datasets, make_loader
+
+LOG_FILE = 'logs/loader_autotune.jsonl'
+
+
+def candidate_worker_counts():
+    """0, 1, 2, 4, ... up to the number of cores"""
+    cpus = os.cpu_count() or 1
+    counts = [0, 1]
+    while counts[-1] * 2 <= cpus:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cpus:
+        counts.append(cpus)
+    return counts
+
+
+def measure_throughput(dataset, batch_size, num_workers, num_batches=20, warmup_batches=3):
+    """Samples/sec pulled from a loader, after worker start-up and warm-up"""
+    loader = make_loader(dataset, batch_size, shuffle=True, num_workers=num_workers)
+    iterator = iter(loader)
+
+    samples = 0
+    start = None
+    for batch_idx in range(warmup_batches + num_batches):
+        try:
+            images, _ = next(iterator)
+        except StopIteration:
+            break
+        if batch_idx == warmup_batches - 1:
+            start = time.perf_counter()
+        elif batch_idx >= warmup_batches:
+            samples += len(images)
+
+    elapsed = time.perf_counter() - start if start is not None else 0.0
+    del iterator, loader
+    return samples / elapsed if elapsed > 0 else 0.0
+
+
+def autotune_num_workers(dataset, batch_size, candidates=None, num_batches=20, log_file=LOG_FILE):
+    """Measure every candidate worker count and return the fastest one
+
+    Results are appended to log_file (one JSON line per run) so hosts can be compared.
+    """
+    candidates = candidates or candidate_worker_counts()
+    print(f"🔧 Autotuning loader workers over {candidates}...")
+
+    results = {}
+    for num_workers in candidates:
+        results[num_workers] = measure_throughput(dataset, batch_size, num_workers, num_batches)
+        print(f"   {num_workers:>3} workers: {results[num_workers]:8.1f} samples/sec")
+
+    best = max(results, key=results.get)
+    print(f"✅ Best: {best} workers ({results[best]:.1f} samples/sec)")
+
+    os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+    with open(log_file, 'a') as f:
+        f.write(json.dumps({
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'host': socket.gethostname(),
+            'cpus': os.cpu_count(),
+            'batch_size': batch_size,
+            'samples_per_sec': {str(k): round(v, 1) for k, v in results.items()},
+            'best_num_workers': best,
+        }) + '\n')
+
+    return best
+
+
+if __name__ == "__main__":
+    train_transform, test_transform = get_transforms()
+    train_dataset, _ = get_datasets(train_transform, test_transform)
+    autotune_num_workers(train_dataset, batch_size=16)
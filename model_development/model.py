@@ -1,32 +1,159 @@
-# completion_certificate.py
-print("🎓 OFFICIAL ROLE COMPLETION CERTIFICATE")
-print("=" * 50)
-print("ROLE: Model Developer - Fine-tuning & Optimization")
-print("PROJECT: Deepfake Detection with VGG19")
-print("=" * 50)
-print()
-print("✅ DELIVERABLES COMPLETED:")
-print("1. VGG19 pretrained on ImageNet - LOADED")
-print("2. Final classification layer modified for real/fake - DONE")
-print("3. Dataset loader from Role 1 integrated - WORKING")
-print("4. Transfer learning applied (frozen layers) - IMPLEMENTED")
-print("5. Hyperparameters tuned (Adam optimizer) - CONFIGURED")
-print("6. Training monitoring setup - READY")
-print("7. Model checkpoints for inference - IMPLEMENTED")
-print()
-print("🔧 TECHNICAL STACK:")
-print("• Framework: PyTorch")
-print("• Model: VGG19 with custom classifier")
-print("• Training: Transfer learning with frozen base")
-print("• Optimization: Adam optimizer, cross-entropy loss")
-print("• Infrastructure: Checkpoints, data loaders, validation")
-print()
-print("📊 PROOF OF WORKING:")
-print("• Training executed successfully")
-print("• Loss decreased from 0.56 to 0.0001")
-print("• Model architecture verified")
-print("• Data pipeline integration confirmed")
-print()
-print("=" * 50)
-print("STATUS: ROLE 2 - 100% COMPLETE ✅")
-print("=" * 50)
\ No newline at end of file
+# model_development/model.py
+import os
+import time
+import torch
+import torch.nn as nn
+from torchvision import models
+
+# Pretrained weights are only ever read from disk: this directory first, then the torch hub cache
+WEIGHTS_DIR = os.environ.get('DEEPFAKE_WEIGHTS_DIR', 'weights')
+
+
+def _pooled(net, x):
+    return torch.flatten(net.avgpool(net.features(x)), 1)
+
+
+def _resnet_pooled(net, x):
+    x = net.maxpool(net.relu(net.bn1(net.conv1(x))))
+    x = net.layer4(net.layer3(net.layer2(net.layer1(x))))
+    return torch.flatten(net.avgpool(x), 1)
+
+
+# torchvision constructor name -> its weights enum, the ImageNet Linear replaced by the
+# two-class layer, the frozen feature extractor and the trainable head on top of it
+BACKBONES = {
+    "vgg19": dict(weights="VGG19_Weights", head="classifier.6",
+                  # classifier[:5] is Linear-ReLU-Dropout-Linear-ReLU, all frozen
+                  features=lambda net, x: net.classifier[:5](_pooled(net, x)),
+                  classify=lambda net, f: net.classifier[5:](f)),
+    "resnet18": dict(weights="ResNet18_Weights", head="fc",
+                     features=_resnet_pooled, classify=lambda net, f: net.fc(f)),
+    "resnet50": dict(weights="ResNet50_Weights", head="fc",
+                     features=_resnet_pooled, classify=lambda net, f: net.fc(f)),
+    # classifier is Linear-Hardswish-Dropout-Linear, the first Linear stays frozen
+    "mobilenet_v3_small": dict(weights="MobileNet_V3_Small_Weights", head="classifier.3",
+                               features=lambda net, x: net.classifier[:3](_pooled(net, x)),
+                               classify=lambda net, f: net.classifier[3:](f)),
+    "mobilenet_v3_large": dict(weights="MobileNet_V3_Large_Weights", head="classifier.3",
+                               features=lambda net, x: net.classifier[:3](_pooled(net, x)),
+                               classify=lambda net, f: net.classifier[3:](f)),
+    "efficientnet_b0": dict(weights="EfficientNet_B0_Weights", head="classifier.1",
+                            features=_pooled, classify=lambda net, f: net.classifier(f)),
+}
+
+
+def weights_file(backbone):
+    """(local path or None, expected file name, download URL) of the ImageNet weights of backbone"""
+    url = getattr(models, BACKBONES[backbone]["weights"]).DEFAULT.url
+    filename = os.path.basename(url)
+    for directory in (WEIGHTS_DIR, os.path.join(torch.hub.get_dir(), 'checkpoints')):
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            return path, filename, url
+    return None, filename, url
+
+
+def _build_network(backbone, pretrained, weights_path=None):
+    """torchvision network for backbone, with ImageNet weights read from a local file when pretrained"""
+    if not pretrained:
+        return getattr(models, backbone)(weights=None)
+    path, filename, url = weights_file(backbone)
+    path = weights_path or path
+    if path is None:
+        raise FileNotFoundError(f"No local weights for {backbone}: download {url} to "
+                                f"{os.path.join(WEIGHTS_DIR, filename)} or pass weights_path")
+    # Built on the meta device, so the random init is skipped and the loaded tensors are used as they are
+    with torch.device('meta'):
+        network = getattr(models, backbone)(weights=None)
+    network.load_state_dict(torch.load(path, map_location='cpu', weights_only=True), assign=True)
+    return network
+
+
+class DeepFakeDetector(nn.Module):
+    def __init__(self, backbone='vgg19', pretrained=True, weights_path=None):
+        super(DeepFakeDetector, self).__init__()
+        if backbone not in BACKBONES:
+            raise ValueError(f"Unknown backbone: {backbone} (choose from {', '.join(BACKBONES)})")
+        self.backbone = backbone
+        # Registered under the backbone name, so VGG19 state dicts keep their vgg19.* keys
+        # pretrained=False when every weight comes from a checkpoint anyway
+        self.add_module(backbone, _build_network(backbone, pretrained, weights_path))
+
+        # Transfer learning: freeze the pretrained network
+        for param in self.network.parameters():
+            param.requires_grad = False
+
+        # Replace the final layer for real/fake classification (trainable)
+        head = BACKBONES[backbone]["head"]
+        parent, _, name = head.rpartition('.')
+        parent = self.network.get_submodule(parent) if parent else self.network
+        setattr(parent, name, nn.Linear(self.network.get_submodule(head).in_features, 2))
+
+    @property
+    def network(self):
+        return getattr(self, self.backbone)
+
+    def train(self, mode=True):
+        """Frozen BatchNorm layers keep their ImageNet statistics, also while the head trains"""
+        super().train(mode)
+        for module in self.network.modules():
+            if isinstance(module, nn.modules.batchnorm._BatchNorm):
+                module.eval()
+        return self
+
+    def forward(self, x):
+        return self.classify_features(self.extract_features(x))
+
+    def extract_features(self, x):
+        """Penultimate activations from the frozen part of the network"""
+        return BACKBONES[self.backbone]["features"](self.network, x)
+
+    def classify_features(self, features):
+        """Trainable head (Dropout + Linear, or just Linear) applied to extract_features output"""
+        return BACKBONES[self.backbone]["classify"](self.network, features)
+
+    def frozen_state_dict(self):
+        """Weights of the frozen part, used to fingerprint cached features"""
+        head = f"{self.backbone}.{BACKBONES[self.backbone]['head']}."
+        return {name: tensor for name, tensor in self.state_dict().items() if not name.startswith(head)}
+
+def create_model(device='cpu', pretrained=True, backbone='vgg19', weights_path=None):
+    model = DeepFakeDetector(backbone, pretrained, weights_path)
+    return model.to(device)
+
+
+def model_skeleton(backbone='vgg19'):
+    """DeepFakeDetector on the meta device: no memory, no init, waiting for load_state_dict(assign=True)"""
+    with torch.device('meta'):
+        return DeepFakeDetector(backbone, pretrained=False)
+
+
+def profile_backbone(backbone, batch_size=1, runs=20, image_size=224):
+    """Parameter counts, GFLOPs per image and median CPU latency of one backbone (random weights)"""
+    from torch.utils.flop_counter import FlopCounterMode
+
+    model = create_model(pretrained=False, backbone=backbone).eval()
+    x = torch.randn(batch_size, 3, image_size, image_size)
+    with torch.no_grad():
+        with FlopCounterMode(display=False) as counter:
+            model(x)
+        for _ in range(3):
+            model(x)
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            model(x)
+            times.append(time.perf_counter() - start)
+    return {
+        'backbone': backbone,
+        'params': sum(p.numel() for p in model.parameters()),
+        'trainable': sum(p.numel() for p in model.parameters() if p.requires_grad),
+        'gflops': counter.get_total_flops() / batch_size / 1e9,
+        'latency_ms': 1000 * sorted(times)[len(times) // 2] / batch_size,
+    }
+
+if __name__ == '__main__':
+    for name in BACKBONES:
+        row = profile_backbone(name)
+        print(f"{name:>20}: {row['params'] / 1e6:6.1f}M params ({row['trainable']} trainable), "
+              f"{row['gflops']:6.2f} GFLOPs, {row['latency_ms']:7.1f} ms/image on CPU")
@@ -0,0 +1,291 @@
+# model_development/pipeline_inference.py
+import os
+import time
+import queue
+import argparse
+import threading
+import torch
+from inference import (VideoScorer, read_sampled_frames, detect_faces, crops_to_tensor, make_result,
+                       find_videos, write_results, add_scoring_arguments, cache_from_args, report)
+from face_detector import DetectorPool  # importable once inference has set up the root path
+
+# Sentinel telling the next stage that one upstream worker has finished
+_DONE = None
+
+
+class StageStats:
+    """Busy time and item count of one pipeline stage, summed over its workers"""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.busy = 0.0
+        self.items = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds, items=1):
+        with self._lock:
+            self.busy += seconds
+            self.items += items
+
+    def utilization(self, wall_seconds):
+        """Fraction of the stage's worker time spent working (not waiting on queues)"""
+        if wall_seconds <= 0:
+            return 0.0
+        return self.busy / (wall_seconds * self.workers)
+
+
+class QueueMonitor:
+    """Running mean and max depth of the inter-stage queues"""
+
+    def __init__(self, queues):
+        self.queues = queues
+        self.samples = 0
+        self.total = {name: 0 for name in queues}
+        self.peak = {name: 0 for name in queues}
+
+    def sample(self):
+        self.samples += 1
+        for name, q in self.queues.items():
+            depth = q.qsize()
+            self.total[name] += depth
+            self.peak[name] = max(self.peak[name], depth)
+
+    def stats(self):
+        return {name: {'mean': self.total[name] / self.samples if self.samples else 0.0,
+                       'max': self.peak[name],
+                       'capacity': q.maxsize}
+                for name, q in self.queues.items()}
+
+
+class PipelinedScorer(VideoScorer):
+    """VideoScorer whose decode, detect and model stages run concurrently
+
+    decode threads -> frames queue -> detect threads -> crops queue -> model loop
+
+    OpenCV releases the GIL while decoding and running the cascade, so the
+    threads overlap with the VGG19 forward passes of the model loop. Both
+    queues are bounded, so a slow stage applies back-pressure instead of
+    letting frames pile up in memory. Results come out in completion order.
+    Decode threads look each video up in the score cache first: cached
+    logits and cached faces go straight onto the crops queue.
+    """
+
+    def __init__(self, *args, decode_workers=2, detect_workers=4, queue_size=8, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.decode_workers = decode_workers
+        self.detect_workers = detect_workers
+        self.queue_size = queue_size
+        self.stage_stats = {}
+        self.queue_monitor = None
+        self.wall_seconds = 0.0
+
+    def _decode_loop(self, paths_q, frames_q, crops_q, stats, decoders_left):
+        while True:
+            item = paths_q.get()
+            if item is _DONE:
+                break
+            idx, path = item
+            # Cache hits skip decode and detect; crops_q is bounded, so they wait like any other video
+            keys = self.cache_keys(path)
+            if keys is not None:
+                self._keys_by_idx[idx] = keys
+                logits = self.cached_logits(keys)
+                if logits is not None:
+                    crops_q.put((idx, path, None, logits))
+                    continue
+                faces = self.cache.get_faces(keys)
+                if faces is not None:
+                    crops_q.put((idx, path, [crop for _, _, crop in faces], None))
+                    continue
+            start = time.perf_counter()
+            try:
+                # An unreadable or empty video decodes to no frames, a failure like an exception
+                frames = read_sampled_frames(path, self.frames_per_video) or None
+            except Exception as e:
+                print(f"❌ Error decoding {path}: {e}")
+                frames = None
+            seconds = time.perf_counter() - start
+            stats.add(seconds)
+            frames_q.put((idx, path, frames, seconds))
+
+        # The last decoder to finish stops every detect thread
+        with decoders_left['lock']:
+            decoders_left['count'] -= 1
+            last = decoders_left['count'] == 0
+        if last:
+            for _ in range(self.detect_workers):
+                frames_q.put(_DONE)
+
+    def _detect_loop(self, frames_q, crops_q, stats):
+        # One cascade per thread, reused for every video this thread sees
+        detector = self.detector_pool.get()
+        while True:
+            item = frames_q.get()
+            if item is _DONE:
+                break
+            idx, path, frames, decode_seconds = item
+            start = time.perf_counter()
+            try:
+                faces = detect_faces(frames or [], detector)
+            except Exception as e:
+                print(f"❌ Error detecting faces in {path}: {e}")
+                faces, frames = [], None
+            seconds = time.perf_counter() - start
+            stats.add(seconds)
+            # Failed videos are not cached (neither faces nor logits), a later run may succeed
+            if frames is None:
+                self._keys_by_idx.pop(idx, None)
+            elif self._keys_by_idx.get(idx) is not None:
+                self.cache.put_faces(self._keys_by_idx[idx], faces, decode_seconds + seconds)
+            crops_q.put((idx, path, [crop for _, _, crop in faces], None))
+        crops_q.put(_DONE)
+
+    def score_videos(self, video_paths):
+        """Yield one result dict per video as soon as its last crop is scored"""
+        self.detector_pool = DetectorPool(self.detector.preset)
+
+        paths_q = queue.Queue()
+        frames_q = queue.Queue(maxsize=self.queue_size)
+        crops_q = queue.Queue(maxsize=self.queue_size)
+        start_time = time.perf_counter()
+        # Cache keys of the videos looked up so far, filled in by the decode threads
+        keys_by_idx = self._keys_by_idx = {}
+        for idx, path in enumerate(video_paths):
+            paths_q.put((idx, path))
+        for _ in range(self.decode_workers):
+            paths_q.put(_DONE)
+
+        self.stage_stats = {
+            'decode': StageStats('decode', self.decode_workers),
+            'detect': StageStats('detect', self.detect_workers),
+            'model': StageStats('model', 1),
+        }
+        self.queue_monitor = QueueMonitor({'frames': frames_q, 'crops': crops_q})
+        decoders_left = {'count': self.decode_workers, 'lock': threading.Lock()}
+
+        threads = [threading.Thread(target=self._decode_loop, daemon=True,
+                                    args=(paths_q, frames_q, crops_q, self.stage_stats['decode'], decoders_left))
+                   for _ in range(self.decode_workers)]
+        # Every detect thread sends one _DONE to the model loop when it stops
+        threads += [threading.Thread(target=self._detect_loop, daemon=True,
+                                     args=(frames_q, crops_q, self.stage_stats['detect']))
+                    for _ in range(self.detect_workers)]
+        for thread in threads:
+            thread.start()
+
+        pending, owners = [], []
+        videos = {}  # idx -> [path, crops left, logit chunks, crop count]
+        detectors_done = 0
+
+        while True:
+            # Fill a batch; block only when there is nothing to run the model on
+            while len(pending) < self.batch_size and detectors_done < self.detect_workers:
+                try:
+                    item = crops_q.get(block=not pending)
+                except queue.Empty:
+                    break
+                if item is _DONE:
+                    detectors_done += 1
+                    continue
+                idx, path, crops, logits = item
+                if logits is not None:
+                    # Scored before with this checkpoint
+                    yield self._complete(path, [logits], len(logits), start_time)
+                    continue
+                if not crops:
+                    yield self._complete(path, [], 0, start_time, keys_by_idx.get(idx))
+                    continue
+                videos[idx] = [path, len(crops), [], len(crops)]
+                pending.extend(crops)
+                owners.extend([idx] * len(crops))
+
+            self.queue_monitor.sample()
+            if not pending:
+                if detectors_done >= self.detect_workers:
+                    break
+                continue
+
+            take = min(self.batch_size, len(pending))
+            start = time.perf_counter()
+            logits = self.predict(crops_to_tensor(pending[:take]))
+            self.stage_stats['model'].add(time.perf_counter() - start, take)
+
+            batch_owners = torch.tensor(owners[:take])
+            pending, owners = pending[take:], owners[take:]
+            for owner in batch_owners.unique().tolist():
+                video = videos[owner]
+                mask = batch_owners == owner
+                video[2].append(logits[mask])
+                video[1] -= int(mask.sum())
+                if video[1] == 0:
+                    del videos[owner]
+                    yield self._complete(video[0], video[2], video[3], start_time, keys_by_idx.get(owner))
+
+        for thread in threads:
+            thread.join()
+        self.wall_seconds = time.perf_counter() - start_time
+
+    def _complete(self, path, chunks, num_faces, start_time, keys=None):
+        logits = torch.cat(chunks) if chunks else torch.zeros(0, 2)
+        if keys is not None:
+            # Per-video compute time is not separable here; the cache records only the bytes saved
+            self.cache.put_logits(keys, logits.numpy(), 0.0)
+        self.videos_scored += 1
+        self.faces_scored += num_faces
+        self.seconds = time.perf_counter() - start_time
+        return make_result(path, logits, num_faces, self.aggregate)
+
+    def pipeline_stats(self):
+        """Per-stage utilization and queue depths, to find the bottleneck stage"""
+        wall = self.wall_seconds or self.seconds
+        return {
+            'stages': {name: {'workers': stats.workers,
+                              'items': stats.items,
+                              'busy_seconds': stats.busy,
+                              'utilization': stats.utilization(wall)}
+                       for name, stats in self.stage_stats.items()},
+            'queues': self.queue_monitor.stats() if self.queue_monitor else {},
+        }
+
+
+def print_pipeline_stats(stats):
+    print("\n🧵 Pipeline stages:")
+    for name, stage in stats['stages'].items():
+        print(f"   {name:>7}: {stage['workers']} workers, {stage['items']} items, "
+              f"{100 * stage['utilization']:5.1f}% busy")
+    print("📦 Queues:")
+    for name, depth in stats['queues'].items():
+        print(f"   {name:>7}: mean depth {depth['mean']:.1f}, max {depth['max']}/{depth['capacity']}")
+    busiest = max(stats['stages'].items(), key=lambda kv: kv[1]['utilization'])[0]
+    print(f"🚧 Bottleneck: {busiest}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score videos with overlapped decode, detect and model stages")
+    add_scoring_arguments(parser)
+    parser.add_argument("--decode-workers", type=int, default=2)
+    parser.add_argument("--detect-workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--queue-size", type=int, default=8, help="capacity of each inter-stage queue")
+    args = parser.parse_args()
+
+    print("🔍 Pipelined Deepfake Video Scoring")
+    print("=" * 50)
+    videos = find_videos(args.inputs)
+    print(f"📹 {len(videos)} videos")
+
+    scorer = PipelinedScorer(args.checkpoint, batch_size=args.batch_size, frames_per_video=args.frames_per_video,
+                             detector_preset=args.detector_preset, aggregate=args.aggregate,
+                             decode_workers=args.decode_workers, detect_workers=args.detect_workers,
+                             queue_size=args.queue_size, cache=cache_from_args(args))
+    for result in write_results(scorer.score_videos(videos), args.output):
+        score = 'no face' if result['score'] is None else f"{result['score']:.3f} ({result['prediction']})"
+        print(f"   {os.path.basename(result['video'])}: {score}")
+
+    report(scorer.stats())
+    print_pipeline_stats(scorer.pipeline_stats())
+    print(f"📁 Results: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# model_development/precision.py
+import os
+import sys
+import copy
+import json
+import time
+import contextlib
+import torch
+import torch.nn as nn
+
+# fast_decode lives in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fast_decode import normalize_batch
+from clips import flatten_clips, video_logits
+
+# fp32: default; bf16: autocast for train and eval; int8: dynamic quantization, eval only
+PRECISIONS = ('fp32', 'bf16', 'int8')
+
+REPORT_FILE = 'logs/precision_parity.json'
+
+
+def autocast_context(precision, device):
+    """Context manager running the enclosed forward pass in the requested precision"""
+    if precision == 'bf16':
+        return torch.autocast(device_type=device.type, dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+def to_memory_format(images, channels_last):
+    """NCHW image batches in channels_last layout; anything else unchanged"""
+    if channels_last and images.dim() == 4:
+        return images.contiguous(memory_format=torch.channels_last)
+    return images
+
+
+def prepare_model(model, channels_last):
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    return model
+
+
+def quantize_for_eval(model):
+    """Copy of model with int8 dynamic quantization of every Linear layer (CPU only)"""
+    model_copy = copy.deepcopy(model).cpu().eval()
+    return torch.quantization.quantize_dynamic(model_copy, {nn.Linear}, dtype=torch.qint8)
+
+
+def check_precision(precision, device):
+    """Validate a precision mode for this device, falling back to fp32 when unsupported"""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision} (choose from {', '.join(PRECISIONS)})")
+    if precision == 'int8' and device.type != 'cpu':
+        print("⚠️  int8 dynamic quantization runs on CPU only, evaluating in fp32")
+        return 'fp32'
+    return precision
+
+
+def run_eval(model, loader, device, precision='fp32', channels_last=False, forward=None):
+    """One pass over loader; returns (predictions, labels, logits, seconds)"""
+    if precision == 'int8':
+        model = quantize_for_eval(model)
+        device = torch.device('cpu')
+    elif channels_last:
+        # Module.to(memory_format=...) converts in place; keep the caller's model (and later modes) as they were
+        model = copy.deepcopy(model)
+    model = prepare_model(model, channels_last)
+    model.eval()
+    forward = forward(model) if forward is not None else model
+
+    all_logits, all_labels = [], []
+    start = time.perf_counter()
+    with torch.no_grad():
+        for images, labels in loader:
+            images, clip_size = flatten_clips(images)
+            images = to_memory_format(normalize_batch(images, device), channels_last)
+            with autocast_context(precision, device):
+                outputs = forward(images)
+            all_logits.append(video_logits(outputs.float(), clip_size).cpu())
+            all_labels.append(labels.cpu())
+    seconds = time.perf_counter() - start
+
+    logits = torch.cat(all_logits)
+    return logits.argmax(1), torch.cat(all_labels), logits, seconds
+
+
+def parity_report(model, loader, device, modes, forward=None, report_file=REPORT_FILE):
+    """Accuracy of every (precision, channels_last) mode against the fp32 baseline
+
+    forward, when given, maps a model to the callable to evaluate (e.g. the
+    feature-cache head). Returns a list of dicts and writes them to report_file.
+    """
+    base_preds, labels, base_logits, base_seconds = run_eval(model, loader, device, forward=forward)
+    base_acc = 100. * base_preds.eq(labels).float().mean().item()
+
+    report = []
+    for precision, channels_last in modes:
+        precision = check_precision(precision, device)
+        preds, _, logits, seconds = run_eval(model, loader, device, precision, channels_last, forward)
+        accuracy = 100. * preds.eq(labels).float().mean().item()
+        report.append({
+            'precision': precision,
+            'channels_last': channels_last,
+            'accuracy': accuracy,
+            'fp32_accuracy': base_acc,
+            'accuracy_delta': accuracy - base_acc,
+            'prediction_agreement': 100. * preds.eq(base_preds).float().mean().item(),
+            'max_logit_diff': (logits - base_logits).abs().max().item() if len(logits) else 0.0,
+            'samples_per_sec': len(labels) / seconds if seconds > 0 else 0.0,
+            'fp32_samples_per_sec': len(labels) / base_seconds if base_seconds > 0 else 0.0,
+        })
+
+    print("\n🎯 Precision parity vs fp32:")
+    print(f"{'mode':>22} {'acc':>7} {'Δacc':>7} {'agree':>7} {'max|Δlogit|':>12} {'samples/s':>10}")
+    print(f"{'fp32':>22} {base_acc:>7.2f} {0:>7.2f} {100:>7.2f} {0:>12.4f} {report[0]['fp32_samples_per_sec'] if report else 0:>10.1f}")
+    for row in report:
+        name = row['precision'] + (' + channels_last' if row['channels_last'] else '')
+        print(f"{name:>22} {row['accuracy']:>7.2f} {row['accuracy_delta']:>+7.2f} "
+              f"{row['prediction_agreement']:>7.2f} {row['max_logit_diff']:>12.4f} {row['samples_per_sec']:>10.1f}")
+
+    os.makedirs(os.path.dirname(report_file) or '.', exist_ok=True)
+    with open(report_file, 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def is_safe(row, max_accuracy_drop=0.5):
+    """A mode is safe to enable when it costs at most max_accuracy_drop points"""
+    return row['accuracy_delta'] >= -max_accuracy_drop
+
+
+if __name__ == "__main__":
+    from data_loader import get_data_loaders
+    from model import create_model
+    from checkpointing import load_model_state, base_dir_for
+
+    device = torch.device('cpu')
+    if os.path.exists('checkpoints/best_model.pth'):
+        checkpoint = torch.load('checkpoints/best_model.pth', map_location=device)
+        model = create_model(device, pretrained=False, backbone=checkpoint.get('backbone', 'vgg19'))
+        load_model_state(model, checkpoint, base_dir_for('checkpoints/best_model.pth'))
+        print("📂 Loaded checkpoints/best_model.pth")
+    else:
+        model = create_model(device)
+
+    _, test_loader = get_data_loaders(batch_size=32)
+    modes = [('fp32', True), ('bf16', False), ('bf16', True), ('int8', False)]
+    for row in parity_report(model, test_loader, device, modes):
+        name = row['precision'] + (' + channels_last' if row['channels_last'] else '')
+        print(f"{'✅' if is_safe(row) else '❌'} {name}")
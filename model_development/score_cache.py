@@ -0,0 +1,283 @@
+# model_development/score_cache.py
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import collections
+import numpy as np
+
+CACHE_DIR = 'score_cache'
+DEFAULT_MAX_BYTES = 10 << 30
+
+# Sampled content hash: the head and tail of the file plus evenly spaced chunks
+HASH_EDGE_BYTES = 1 << 20
+HASH_CHUNK_BYTES = 64 << 10
+HASH_CHUNKS = 16
+
+# Eviction trims down to this fraction of max_bytes so it does not run on every put
+LOW_WATER = 0.9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    source_bytes INTEGER NOT NULL,
+    compute_seconds REAL NOT NULL,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries(last_access);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+# File hashes already computed in this process, keyed by (path, size, mtime)
+_file_hashes = {}
+
+
+def video_hash(path):
+    """Fast content hash of a video file
+
+    Re-uploads of a clip are byte-identical, so hashing the size, the first
+    and last MiB and 16 spaced 64 KiB chunks finds them without reading the
+    whole file. Small files are hashed completely.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(size.to_bytes(8, 'little'))
+    with open(path, 'rb') as f:
+        if size <= 2 * HASH_EDGE_BYTES + HASH_CHUNKS * HASH_CHUNK_BYTES:
+            digest.update(f.read())
+        else:
+            middle = size - 2 * HASH_EDGE_BYTES - HASH_CHUNK_BYTES
+            reads = [(0, HASH_EDGE_BYTES)]
+            reads += [(HASH_EDGE_BYTES + i * middle // (HASH_CHUNKS - 1), HASH_CHUNK_BYTES)
+                      for i in range(HASH_CHUNKS)]
+            reads.append((size - HASH_EDGE_BYTES, HASH_EDGE_BYTES))
+            for offset, length in reads:
+                f.seek(offset)
+                digest.update(f.read(length))
+    return digest.hexdigest()
+
+
+def file_hash(path):
+    """Full SHA-1 of a file such as a checkpoint, computed once per process"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _file_hashes:
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        _file_hashes[key] = digest.hexdigest()
+    return _file_hashes[key]
+
+
+def make_key(kind, *parts):
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(kind.encode())
+    for part in parts:
+        digest.update(b'\0' + str(part).encode())
+    return digest.hexdigest()
+
+
+class ScoreCache:
+    """Persistent cache of per-video scoring work, shared by every process on the machine
+
+    Two kinds of entries, both keyed by the video content hash and the
+    sampling parameters:
+      faces  - frame indices, boxes and crops; reused when only the checkpoint changed
+      logits - per-face logits for one checkpoint; the final score is a cheap
+               aggregation of these, so any --aggregate can be served from them
+
+    Arrays live in one .npz file per entry, written to a temp file and renamed
+    into place. An SQLite index in WAL mode holds sizes and access times, so
+    concurrent workers can read and write safely and the least recently used
+    entries are evicted once the cache grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, store_crops=True):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.store_crops = store_crops
+        self.db_path = os.path.join(cache_dir, 'index.sqlite')
+        os.makedirs(os.path.join(cache_dir, 'blobs'), exist_ok=True)
+        self.session = collections.Counter()
+        # Scoring threads (pipeline stages, service workers) share one cache object
+        self._session_lock = threading.Lock()
+        self._local = threading.local()
+        self._db()  # create the schema up front
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_local']
+        del state['_session_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._session_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _db(self):
+        """SQLite connection of the calling thread (and process)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _blob_path(self, key):
+        return os.path.join(self.cache_dir, 'blobs', key[:2], f'{key}.npz')
+
+    def _count(self, **increments):
+        with self._session_lock:
+            self.session.update(increments)
+        self._db().executemany(
+            'INSERT INTO counters (name, value) VALUES (?, ?) '
+            'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+            list(increments.items()))
+
+    def keys_for(self, video_path, frames_per_video, detector_preset, checkpoint_hash):
+        """{'faces', 'logits', 'source_bytes'} for one video, or None if it cannot be read"""
+        try:
+            content = video_hash(video_path)
+            source_bytes = os.path.getsize(video_path)
+        except OSError:
+            return None
+        faces = make_key('faces', content, frames_per_video, detector_preset)
+        return {
+            'faces': faces,
+            'logits': make_key('logits', faces, checkpoint_hash),
+            'source_bytes': source_bytes,
+        }
+
+    def get(self, kind, key):
+        """Dict of arrays stored under key, or None on a miss"""
+        db = self._db()
+        row = db.execute('SELECT source_bytes, compute_seconds FROM entries WHERE key = ?', (key,)).fetchone()
+        arrays = None
+        if row is not None:
+            try:
+                with np.load(self._blob_path(key)) as data:
+                    arrays = {name: data[name] for name in data.files}
+            except (OSError, ValueError):
+                # Evicted or overwritten underneath us; drop the stale row
+                db.execute('DELETE FROM entries WHERE key = ?', (key,))
+
+        if arrays is None:
+            self._count(**{f'{kind}_misses': 1})
+            return None
+        db.execute('UPDATE entries SET last_access = ?, hits = hits + 1 WHERE key = ?', (time.time(), key))
+        self._count(**{f'{kind}_hits': 1, 'bytes_saved': row[0], 'seconds_saved': row[1]})
+        return arrays
+
+    def put(self, kind, key, arrays, source_bytes=0, compute_seconds=0.0):
+        """Store arrays under key, then evict least recently used entries if over budget"""
+        path = self._blob_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        db = self._db()
+        now = time.time()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute('INSERT OR REPLACE INTO entries '
+                       '(key, kind, bytes, source_bytes, compute_seconds, created, last_access) '
+                       'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                       (key, kind, size, source_bytes, compute_seconds, now, now))
+            evicted = self._evict(db)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        for old_key in evicted:
+            try:
+                os.remove(self._blob_path(old_key))
+            except FileNotFoundError:
+                pass
+        if evicted:
+            self._count(evictions=len(evicted))
+
+    def _evict(self, db):
+        total = db.execute('SELECT COALESCE(SUM(bytes), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return []
+        evicted = []
+        target = self.max_bytes * LOW_WATER
+        for key, size in db.execute('SELECT key, bytes FROM entries ORDER BY last_access').fetchall():
+            if total <= target:
+                break
+            evicted.append(key)
+            total -= size
+        db.executemany('DELETE FROM entries WHERE key = ?', [(key,) for key in evicted])
+        return evicted
+
+    def get_faces(self, keys):
+        """[(frame_idx, box, crop)] of a video, or None"""
+        if not self.store_crops:
+            return None
+        arrays = self.get('faces', keys['faces'])
+        if arrays is None:
+            return None
+        return [(int(frame_idx), tuple(int(v) for v in box), crop)
+                for frame_idx, box, crop in zip(arrays['frame_idx'], arrays['boxes'], arrays['crops'])]
+
+    def put_faces(self, keys, faces, compute_seconds):
+        if not self.store_crops:
+            return
+        arrays = {
+            'frame_idx': np.array([frame_idx for frame_idx, _, _ in faces], dtype=np.int64),
+            'boxes': np.array([box for _, box, _ in faces], dtype=np.int32).reshape(-1, 4),
+            'crops': (np.stack([crop for _, _, crop in faces]) if faces
+                      else np.zeros((0, 224, 224, 3), dtype=np.uint8)),
+        }
+        self.put('faces', keys['faces'], arrays, keys['source_bytes'], compute_seconds)
+
+    def get_logits(self, keys):
+        """Per-face logits (N x 2 float32 array) of a video, or None"""
+        arrays = self.get('logits', keys['logits'])
+        return None if arrays is None else arrays['logits']
+
+    def put_logits(self, keys, logits, compute_seconds):
+        self.put('logits', keys['logits'], {'logits': np.asarray(logits, dtype=np.float32).reshape(-1, 2)},
+                 keys['source_bytes'], compute_seconds)
+
+    def stats(self):
+        """Hit rates and savings for this process ('session') and every process ever ('lifetime')"""
+        db = self._db()
+        lifetime = collections.Counter(dict(db.execute('SELECT name, value FROM counters').fetchall()))
+        entries, size = db.execute('SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM entries').fetchone()
+
+        def summarize(counts):
+            lookups = counts['logits_hits'] + counts['logits_misses']
+            face_lookups = counts['faces_hits'] + counts['faces_misses']
+            return {
+                'logits_hit_rate': counts['logits_hits'] / lookups if lookups else 0.0,
+                'faces_hit_rate': counts['faces_hits'] / face_lookups if face_lookups else 0.0,
+                'lookups': int(lookups),
+                'bytes_saved': int(counts['bytes_saved']),
+                'seconds_saved': float(counts['seconds_saved']),
+                'evictions': int(counts['evictions']),
+            }
+
+        return {
+            'session': summarize(self.session),
+            'lifetime': summarize(lifetime),
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+        }
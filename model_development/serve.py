@@ -0,0 +1,254 @@
+# model_development/serve.py
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import torch
+from inference import (CHECKPOINT, VideoScorer, crops_to_tensor, aggregate_logits,
+                       add_cache_arguments, cache_from_args)
+from face_detector import DetectorPool  # importable once inference has set up the root path
+
+# Latencies kept for the percentile metrics
+LATENCY_WINDOW = 10000
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+
+class MicroBatcher:
+    """Coalesces concurrent face crops into one model forward pass
+
+    The first crop of a batch waits at most max_latency_ms for company; the
+    batch runs as soon as it is full or that window closes. Forward passes run
+    on a single worker thread so the event loop keeps accepting requests.
+    """
+
+    def __init__(self, scorer, max_batch_size=32, max_latency_ms=10):
+        self.scorer = scorer
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000.0
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model')
+        self.batch_sizes = collections.Counter()
+
+    async def submit(self, crops):
+        """Logits (N x 2) for a list of BGR 224x224 crops"""
+        loop = asyncio.get_running_loop()
+        futures = []
+        for crop in crops:
+            future = loop.create_future()
+            await self.queue.put((crop, future))
+            futures.append(future)
+        return torch.stack(await asyncio.gather(*futures)) if futures else torch.zeros(0, 2)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_latency
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            crops = [crop for crop, _ in batch]
+            self.batch_sizes[len(batch)] += 1
+            try:
+                logits = await loop.run_in_executor(self.executor, self.scorer.predict, crops_to_tensor(crops))
+                for (_, future), row in zip(batch, logits):
+                    if not future.done():
+                        future.set_result(row)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+
+class ScoringService:
+    def __init__(self, scorer, max_batch_size=32, max_latency_ms=10, video_workers=2):
+        self.scorer = scorer
+        self.batcher = MicroBatcher(scorer, max_batch_size, max_latency_ms)
+        # Video decode + cascade detection are CPU bound and release the GIL
+        self.video_executor = ThreadPoolExecutor(max_workers=video_workers, thread_name_prefix='video')
+        self.detector_pool = DetectorPool(scorer.detector.preset)
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.requests = collections.Counter()
+        self.started = time.time()
+
+    async def score_image(self, body):
+        image = cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("body is not a decodable image")
+        if image.shape[:2] != (224, 224):
+            image = cv2.resize(image, (224, 224))
+        logits = await self.batcher.submit([image])
+        return {'score': aggregate_logits(logits, self.scorer.aggregate), 'faces': 1}
+
+    async def score_video(self, body):
+        loop = asyncio.get_running_loop()
+        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as f:
+            f.write(body)
+            path = f.name
+        try:
+            keys, logits, faces = await loop.run_in_executor(self.video_executor, self._extract, path)
+        finally:
+            os.remove(path)
+        if logits is None:
+            logits = await self.batcher.submit([crop for _, _, crop in faces or []])
+            # Nothing is cached for an upload that could not be decoded
+            if keys is not None and faces is not None:
+                await loop.run_in_executor(self.video_executor, self.scorer.cache.put_logits,
+                                           keys, logits.numpy(), 0.0)
+        score = aggregate_logits(logits, self.scorer.aggregate) if len(logits) else None
+        return {'score': score, 'faces': len(logits)}
+
+    def _extract(self, path):
+        """(cache keys, cached logits, faces) of an uploaded video
+
+        logits is None on a cache miss, faces is None when there was a hit or
+        the upload could not be decoded.
+        """
+        # Keyed by content, so re-uploads of the same video hit the cache despite the temp path
+        keys = self.scorer.cache_keys(path)
+        logits = self.scorer.cached_logits(keys)
+        if logits is not None:
+            return keys, logits, None
+        return keys, None, self.scorer.extract_faces(path, keys, self.detector_pool.get())
+
+    def metrics(self):
+        latencies = np.array(self.latencies) * 1000.0
+        percentile = (lambda q: float(np.percentile(latencies, q))) if len(latencies) else (lambda q: 0.0)
+        return {
+            'uptime_seconds': time.time() - self.started,
+            'requests': dict(self.requests),
+            'latency_ms': {'p50': percentile(50), 'p90': percentile(90), 'p99': percentile(99),
+                           'window': len(latencies)},
+            'batch_size_histogram': {str(k): v for k, v in sorted(self.batcher.batch_sizes.items())},
+            'queue_depth': self.batcher.queue.qsize(),
+            **({'cache': self.scorer.cache.stats()} if self.scorer.cache is not None else {}),
+        }
+
+    async def handle(self, method, path, body):
+        """(status, payload) for one request"""
+        if method == 'GET' and path == '/metrics':
+            return 200, self.metrics()
+        if method == 'GET' and path == '/health':
+            return 200, {'status': 'ok'}
+        if method == 'POST' and path in ('/score/image', '/score/video'):
+            start = time.perf_counter()
+            try:
+                if path == '/score/image':
+                    result = await self.score_image(body)
+                else:
+                    result = await self.score_video(body)
+            except ValueError as e:
+                self.requests['bad_request'] += 1
+                return 400, {'error': str(e)}
+            self.latencies.append(time.perf_counter() - start)
+            self.requests[path] += 1
+            if result['score'] is not None:
+                result['prediction'] = 'fake' if result['score'] >= 0.5 else 'real'
+            return 200, result
+        return 404, {'error': f'no route for {method} {path}'}
+
+    async def serve_connection(self, reader, writer):
+        """Minimal HTTP/1.1 with keep-alive: one request at a time per connection"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    length = -1
+                # The body cannot be skipped without a valid length, so these close the connection
+                if length < 0:
+                    self.requests['bad_request'] += 1
+                    status, payload = 400, {'error': 'invalid Content-Length'}
+                    keep_alive = False
+                elif length > MAX_BODY_BYTES:
+                    status, payload = 413, {'error': 'body too large'}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    try:
+                        status, payload = await self.handle(method, path.split('?', 1)[0], body)
+                    except Exception as e:
+                        status, payload = 500, {'error': str(e)}
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+
+                data = json.dumps(payload).encode()
+                reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+                          413: 'Payload Too Large', 500: 'Internal Server Error'}[status]
+                writer.write(f'HTTP/1.1 {status} {reason}\r\n'
+                             f'Content-Type: application/json\r\n'
+                             f'Content-Length: {len(data)}\r\n'
+                             f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def run_server(service, host, port):
+    batcher_task = asyncio.create_task(service.batcher.run())
+    server = await asyncio.start_server(service.serve_connection, host, port)
+    print(f"🌐 Listening on http://{host}:{port} (POST /score/image, POST /score/video, GET /metrics)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batcher_task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTP scoring service with dynamic batching")
+    parser.add_argument("--checkpoint", default=CHECKPOINT)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-latency-ms", type=float, default=10.0,
+                        help="how long the first request of a batch may wait for others")
+    parser.add_argument("--frames-per-video", type=int, default=10)
+    parser.add_argument("--video-workers", type=int, default=2)
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+
+    print("🛡️  Deepfake Scoring Service")
+    print("=" * 50)
+    scorer = VideoScorer(args.checkpoint, batch_size=args.max_batch_size, frames_per_video=args.frames_per_video,
+                         cache=cache_from_args(args))
+    service = ScoringService(scorer, args.max_batch_size, args.max_latency_ms, args.video_workers)
+    try:
+        asyncio.run(run_server(service, args.host, args.port))
+    except KeyboardInterrupt:
+        print("\n👋 Stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,16 +5,54 @@ import torch.optim as optim
 from torch.utils.tensorboard import SummaryWriter
 import os
 import time
+import argparse
 from data_loader import get_data_loaders
-from model import create_model
+from feature_cache import get_feature_loaders
+from model import BACKBONES, create_model
+from fast_decode import normalize_batch
+from batch_augment import BatchAugment
+from balanced_sampler import BALANCE_MODES
+from clips import flatten_clips, video_logits
+from instrumentation import StepMetrics, parse_steps
+from evaluation import EvalAccumulator, sample_metadata, log_results, fixed_subsample
+from precision import (PRECISIONS, autocast_context, to_memory_format, prepare_model,
+                       quantize_for_eval, check_precision, parity_report)
+from checkpointing import (CHECKPOINT_DIR, BEST_NAME, BASE_NAME, CheckpointManager, save_base, delta_state,
+                           load_model_state, base_dir_for, rng_state, set_rng_state)
+from run_config import RUN_CONFIG_SUFFIX, RunConfig, add_run_arguments  # repository root, on the path via data_loader
+
+CHECKPOINT_PATH = os.path.join(CHECKPOINT_DIR, BEST_NAME)
+
+
+def num_workers_arg(text):
+    """--num-workers value: a worker count, or 'auto' to let loader_autotune measure the fastest"""
+    return text if text == 'auto' else int(text)
+
 
 class Trainer:
-    def __init__(self, model, train_loader, test_loader, device):
-        self.model = model
+    def __init__(self, model, train_loader, test_loader, device, use_feature_cache=False, batch_augment=None,
+                 precision='fp32', channels_last=False, run_config=None, checkpoints=None, full_checkpoints=False,
+                 log_every=10, profile_steps=None, eval_every=None, eval_subsample=1024):
+        # channels_last only matters for the conv backbone, not for cached features
+        self.channels_last = channels_last and not use_feature_cache
+        self.model = prepare_model(model, self.channels_last)
         self.train_loader = train_loader
         self.test_loader = test_loader
         self.device = device
         self.writer = SummaryWriter('logs')
+        # Stage timings and running metrics, synced only every log_every steps
+        self.metrics = StepMetrics(self.writer, device, log_every=log_every, profile_steps=profile_steps)
+        
+        # With cached features the loaders yield backbone activations, so only the head runs
+        self.use_feature_cache = use_feature_cache
+        self.forward = model.classify_features if use_feature_cache else model
+        # bf16 autocast applies to training and evaluation, int8 to evaluation only
+        self.precision = check_precision(precision, device)
+        self.train_precision = 'fp32' if self.precision == 'int8' else self.precision
+        # Optional BatchAugment applied to uint8 training batches
+        self.batch_augment = batch_augment
+        # Seeds and settings of this run, saved with every checkpoint
+        self.run_config = run_config
         
         self.criterion = nn.CrossEntropyLoss()
         self.optimizer = optim.Adam(
@@ -23,81 +61,189 @@ class Trainer:
         )
         
         self.best_accuracy = 0.0
-        os.makedirs('checkpoints', exist_ok=True)
+        # Method and video of every test sample, for per-method and video-level metrics
+        self.test_metadata = sample_metadata(test_loader.dataset)
+        # Optional quick evaluation every eval_every steps, always on the same subsample
+        self.eval_every = eval_every
+        self.quick_loader = None
+        if eval_every:
+            seed = run_config.seed_for('eval_subsample') if run_config is not None else 0
+            subset = fixed_subsample(test_loader.dataset, eval_subsample, seed)
+            self.quick_loader = torch.utils.data.DataLoader(subset, batch_size=test_loader.batch_size,
+                                                            collate_fn=test_loader.collate_fn)
+            self.quick_metadata = sample_metadata(subset)
+        # Rolling last-N / best-K checkpoints, written on a background thread
+        self.checkpoints = checkpoints or CheckpointManager()
+        # Checkpoints hold only the trainable head, the frozen base is written once and shared
+        base_dir = os.path.join(self.checkpoints.directory, BASE_NAME)
+        self.base_fingerprint = None if full_checkpoints else save_base(model, base_dir)
+    
+    def _seed_epoch(self, epoch):
+        """Reseed the per-epoch streams, so epoch N sees the same batches however the run got there
+        
+        The shuffle order comes from the sampler's own generator. The loader
+        generator only seeds the workers, which main() starts afresh every
+        epoch (persistent_workers=False) so they are seeded from this epoch too.
+        """
+        if self.run_config is None:
+            return
+        sampler_generator = getattr(self.train_loader.sampler, 'generator', None)
+        if sampler_generator is not None:
+            sampler_generator.manual_seed(self.run_config.seed_for('shuffle', epoch))
+        generator = getattr(self.train_loader, 'generator', None)
+        if generator is not None:
+            generator.manual_seed(self.run_config.seed_for('loader_workers', epoch))
+        if self.batch_augment is not None:
+            self.batch_augment.generator.manual_seed(self.run_config.seed_for('batch_augment', epoch))
     
     def train_epoch(self, epoch):
         self.model.train()
-        running_loss = 0.0
-        correct = 0
-        total = 0
+        self._seed_epoch(epoch)
+        metrics = self.metrics
+        metrics.start_epoch(epoch, len(self.train_loader))
         
-        for batch_idx, (images, labels) in enumerate(self.train_loader):
-            images, labels = images.to(self.device), labels.to(self.device)
-            
-            self.optimizer.zero_grad()
-            outputs = self.model(images)
-            loss = self.criterion(outputs, labels)
-            loss.backward()
-            self.optimizer.step()
+        for images, labels in metrics.timed(self.train_loader):
+            with metrics.stage('transfer'):
+                # Clip batches run every crop through the model, the loss is on per-video logits
+                images, clip_size = flatten_clips(images)
+                # uint8 batches (fast_decode) are normalized here, float batches just move
+                images = normalize_batch(images, self.device, augment=self.batch_augment)
+                images = to_memory_format(images, self.channels_last)
+                labels = labels.to(self.device)
             
-            running_loss += loss.item()
-            _, predicted = outputs.max(1)
-            total += labels.size(0)
-            correct += predicted.eq(labels).sum().item()
+            with metrics.stage('forward'):
+                self.optimizer.zero_grad()
+                with autocast_context(self.train_precision, self.device):
+                    outputs = video_logits(self.forward(images), clip_size)
+                    loss = self.criterion(outputs, labels)
+            with metrics.stage('backward'):
+                loss.backward()
+            with metrics.stage('optimizer'):
+                self.optimizer.step()
             
-            if batch_idx % 10 == 0:
-                print(f'Epoch: {epoch} | Batch: {batch_idx}/{len(self.train_loader)} | Loss: {loss.item():.4f}')
+            metrics.step(loss, outputs, labels)
+            if self.eval_every and metrics.global_step % self.eval_every == 0:
+                self.quick_evaluate(metrics.global_step)
         
-        epoch_loss = running_loss / len(self.train_loader)
-        epoch_acc = 100. * correct / total
+        epoch_loss, epoch_acc = metrics.end_epoch()
         
         self.writer.add_scalar('Training Loss', epoch_loss, epoch)
         self.writer.add_scalar('Training Accuracy', epoch_acc, epoch)
         
         return epoch_loss, epoch_acc
     
-    def evaluate(self, epoch):
+    def _eval_forward(self):
+        """(forward callable, device) used by evaluate for the selected precision"""
+        if self.precision != 'int8':
+            return self.forward, self.device
+        # Quantize a fresh copy every time, the head changes between epochs
+        quantized = quantize_for_eval(self.model)
+        return (quantized.classify_features if self.use_feature_cache else quantized), torch.device('cpu')
+    
+    def run_evaluation(self, loader, metadata):
+        """One pass over loader, returning evaluation.compute_metrics results"""
         self.model.eval()
-        running_loss = 0.0
-        correct = 0
-        total = 0
+        forward, device = self._eval_forward()
+        accumulator = EvalAccumulator(len(loader.dataset), device)
         
         with torch.no_grad():
-            for images, labels in self.test_loader:
-                images, labels = images.to(self.device), labels.to(self.device)
-                outputs = self.model(images)
-                loss = self.criterion(outputs, labels)
-                
-                running_loss += loss.item()
-                _, predicted = outputs.max(1)
-                total += labels.size(0)
-                correct += predicted.eq(labels).sum().item()
-        
-        epoch_loss = running_loss / len(self.test_loader)
-        epoch_acc = 100. * correct / total
-        
-        self.writer.add_scalar('Validation Loss', epoch_loss, epoch)
-        self.writer.add_scalar('Validation Accuracy', epoch_acc, epoch)
-        
-        # Save best model
+            for images, labels in loader:
+                images, clip_size = flatten_clips(images)
+                images, labels = normalize_batch(images, device), labels.to(device)
+                images = to_memory_format(images, self.channels_last)
+                with autocast_context(self.precision, device):
+                    outputs = forward(images)
+                accumulator.add(video_logits(outputs.float(), clip_size), labels)
+        
+        return accumulator.results(*metadata)
+    
+    def quick_evaluate(self, step):
+        """Evaluate the fixed test subsample mid-epoch, logged per global step"""
+        results = self.run_evaluation(self.quick_loader, self.quick_metadata)
+        log_results(self.writer, 'Quick', results, step)
+        print(f"⚡ Step {step} | Quick Acc: {results['accuracy']:.2f}% | AUC: {results['auc']:.4f} | "
+              f"EER: {results['eer']:.4f}")
+        self.model.train()
+    
+    def evaluate(self, epoch):
+        results = self.run_evaluation(self.test_loader, self.test_metadata)
+        log_results(self.writer, 'Validation', results, epoch)
+        epoch_loss, epoch_acc = results['loss'], results['accuracy']
+        
+        line = f"AUC: {results['auc']:.4f} | EER: {results['eer']:.4f} | AP: {results['average_precision']:.4f}"
+        if 'video' in results:
+            line += f" | Video AUC: {results['video']['auc']:.4f}"
+        print(line)
+        for method, row in sorted(results.get('per_method', {}).items()):
+            print(f"   {method}: {row['accuracy']:.2f}% of {row['samples']}")
+        
         if epoch_acc > self.best_accuracy:
             self.best_accuracy = epoch_acc
-            torch.save({
-                'epoch': epoch,
-                'model_state_dict': self.model.state_dict(),
-                'optimizer_state_dict': self.optimizer.state_dict(),
-                'accuracy': epoch_acc,
-            }, 'checkpoints/best_model.pth')
-            print(f"💾 New best model saved with accuracy: {epoch_acc:.2f}%")
+            print(f"🏆 New best accuracy: {epoch_acc:.2f}%")
         
         return epoch_loss, epoch_acc
     
-    def train(self, epochs):
+    def checkpoint_state(self, epoch, accuracy):
+        """Everything needed to continue the run after epoch as if it had never stopped"""
+        checkpoint = {
+            'epoch': epoch,
+            'backbone': getattr(self.model, 'backbone', 'vgg19'),
+            # The optimizer only covers trainable parameters, so its state is small either way
+            'optimizer_state_dict': self.optimizer.state_dict(),
+            'accuracy': accuracy,
+            'best_accuracy': self.best_accuracy,
+            'rng_state': rng_state(),
+        }
+        if self.base_fingerprint is None:
+            checkpoint['model_state_dict'] = self.model.state_dict()
+        else:
+            checkpoint.update(delta_state(self.model, self.base_fingerprint))
+        # Checkpoints are taken between epochs, so a balanced stream is exactly at an epoch boundary
+        sampler = self.train_loader.sampler
+        if hasattr(sampler, 'state_dict'):
+            checkpoint['sampler_state'] = sampler.state_dict()
+        if self.batch_augment is not None:
+            checkpoint['batch_augment_state'] = self.batch_augment.generator.get_state()
+        if self.run_config is not None:
+            checkpoint['run_config'] = self.run_config.to_dict()
+        return checkpoint
+    
+    def resume(self, path=None):
+        """Restore a checkpoint (default: the newest one) and return the epoch to continue from
+        
+        Loader order and batch augmentation are reseeded per epoch from the
+        run config, the balanced sampler is fast-forwarded and the global RNGs
+        (dropout, per-sample transforms in the main process) are restored, so
+        the resumed epochs see the same batches as an uninterrupted run.
+        """
+        path = self.checkpoints.resume_from(path)
+        if path is None:
+            print("No checkpoint to resume from, starting at epoch 0")
+            return 0
+        checkpoint = torch.load(path, map_location=self.device)
+        load_model_state(self.model, checkpoint, base_dir_for(path))
+        self.optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+        self.best_accuracy = checkpoint.get('best_accuracy', checkpoint['accuracy'])
+        if 'sampler_state' in checkpoint:
+            self.train_loader.sampler.load_state_dict(checkpoint['sampler_state'])
+        if 'batch_augment_state' in checkpoint and self.batch_augment is not None:
+            self.batch_augment.generator.set_state(checkpoint['batch_augment_state'])
+        if 'rng_state' in checkpoint:
+            set_rng_state(checkpoint['rng_state'])
+        print(f"⏩ Resumed {path} (epoch {checkpoint['epoch']}, accuracy {checkpoint['accuracy']:.2f}%)")
+        return checkpoint['epoch'] + 1
+    
+    def train(self, epochs, resume=False):
+        """Train up to epochs; resume is False, True (newest checkpoint) or a checkpoint path"""
         print(f"Starting training on {self.device}")
         print(f"Training samples: {len(self.train_loader.dataset)}")
         print(f"Test samples: {len(self.test_loader.dataset)}")
+        if self.run_config is not None:
+            path = self.run_config.save(os.path.splitext(CHECKPOINT_PATH)[0] + RUN_CONFIG_SUFFIX)
+            print(f"🎲 {self.run_config} -> {path}")
+        start_epoch = self.resume(resume if isinstance(resume, str) else None) if resume else 0
         
-        for epoch in range(epochs):
+        for epoch in range(start_epoch, epochs):
             start_time = time.time()
             
             train_loss, train_acc = self.train_epoch(epoch)
@@ -109,23 +255,114 @@ class Trainer:
             print(f'Train Loss: {train_loss:.4f} | Train Acc: {train_acc:.2f}%')
             print(f'Val Loss: {val_loss:.4f} | Val Acc: {val_acc:.2f}%')
             print('-' * 50)
+            # Only the CPU copy happens here, the write overlaps the next epoch
+            self.checkpoints.save(self.checkpoint_state(epoch, val_acc), epoch, val_acc)
+        
+        self.checkpoints.close()
+        # Only trust a faster mode if it matches fp32 on the test set
+        if self.precision != 'fp32' or self.channels_last:
+            forward = (lambda m: m.classify_features) if self.use_feature_cache else None
+            report = parity_report(self.model, self.test_loader, self.device,
+                                   [(self.precision, self.channels_last)], forward=forward)
+            self.writer.add_scalar('Precision Accuracy Delta', report[0]['accuracy_delta'], epochs)
         
         self.writer.close()
 
-def main():
+def main(backbone='vgg19', use_feature_cache=False, batch_augment=False, precision='fp32', channels_last=False,
+         balanced=None, clip_size=None, seed=0, deterministic=False, epochs=5, batch_size=16, num_workers=0,
+         shard_dirs=None, resume=False, keep_last=3, keep_best=2, full_checkpoints=False, log_every=10, profile_steps=None,
+         eval_every=None, eval_subsample=1024):
+    # Everything that changes what the model sees, recorded next to the checkpoint
+    run = RunConfig('train', seed, deterministic, backbone=backbone, use_feature_cache=use_feature_cache,
+                    batch_augment=batch_augment, precision=precision, channels_last=channels_last, balanced=balanced,
+                    clip_size=clip_size, epochs=epochs, batch_size=batch_size, num_workers=num_workers,
+                    shard_dirs=shard_dirs)
+    run.seed_globals()
+    
     # Set device
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
     print(f"Using device: {device}")
     
-    # Get data loaders
-    train_loader, test_loader = get_data_loaders(batch_size=16)  # Smaller batch for testing
+    # Create model (the new head is initialized from the seeded global RNG)
+    model = create_model(device, backbone=backbone)
     
-    # Create model
-    model = create_model(device)
+    # Get data loaders
+    if use_feature_cache and clip_size:
+        raise ValueError("Clip mode needs image loaders; cached features are one row per crop")
+    if use_feature_cache:
+        # Frozen backbone runs once per crop, epochs only train the head
+        train_loader, test_loader = get_feature_loaders(model, device, batch_size=batch_size, shard_dirs=shard_dirs,
+                                                        balanced=balanced, seed=run.seed_for('loader'),
+                                                        num_workers=num_workers)
+    else:
+        # Persistent workers would keep the RNG streams of the epoch they started in, so a resumed
+        # run's per-sample augmentations would differ from an uninterrupted one
+        train_loader, test_loader = get_data_loaders(batch_size=batch_size, shard_dirs=shard_dirs,
+                                                     num_workers=num_workers, persistent_workers=False, batch_augment=batch_augment,
+                                                     balanced=balanced, clip_size=clip_size,
+                                                     seed=run.seed_for('loader'))
     
     # Create trainer and start training
-    trainer = Trainer(model, train_loader, test_loader, device)
-    trainer.train(epochs=5)  # Start with 5 epochs for testing
+    augment = BatchAugment(seed=run.seed_for('batch_augment')) if batch_augment and not use_feature_cache else None
+    trainer = Trainer(model, train_loader, test_loader, device,
+                      use_feature_cache=use_feature_cache, batch_augment=augment,
+                      precision=precision, channels_last=channels_last, run_config=run,
+                      checkpoints=CheckpointManager(keep_last=keep_last, keep_best=keep_best),
+                      full_checkpoints=full_checkpoints, log_every=log_every, profile_steps=profile_steps,
+                      eval_every=eval_every, eval_subsample=eval_subsample)
+    trainer.train(epochs=epochs, resume=resume)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the deepfake detector")
+    parser.add_argument("--backbone", choices=list(BACKBONES), default="vgg19",
+                        help="frozen ImageNet backbone, weights read from weights/ or the torch hub cache")
+    parser.add_argument("--feature-cache", action="store_true",
+                        help="cache frozen backbone features on disk and train only the head")
+    parser.add_argument("--batch-augment", action="store_true",
+                        help="decode to uint8 and augment whole batches instead of per-sample PIL transforms")
+    parser.add_argument("--precision", choices=PRECISIONS, default="fp32",
+                        help="fp32, bf16 autocast, or int8 dynamic quantization for evaluation")
+    parser.add_argument("--channels-last", action="store_true",
+                        help="run the convolutional backbone in channels_last memory format")
+    parser.add_argument("--balanced", choices=BALANCE_MODES, nargs="?", const="label_method",
+                        help="draw training batches balanced over label (and manipulation method)")
+    parser.add_argument("--clip-size", type=int, default=None,
+                        help="train and evaluate on clips of this many faces per video, scored per video")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--num-workers", type=num_workers_arg, default=0,
+                        help="data loader worker processes with pinned memory and prefetching, or 'auto' to "
+                             "measure the fastest count (default: 0, load in the training process)")
+    parser.add_argument("--shard-dirs", nargs="+", metavar="DIR",
+                        help="read face crops from these extract_faces.py --output-format shards directories "
+                             "instead of the JPEG face folders")
+    parser.add_argument("--deterministic", action="store_true",
+                        help="force deterministic torch kernels (bit-identical GPU reruns, slower)")
+    parser.add_argument("--resume", nargs="?", const=True, default=False, metavar="CHECKPOINT",
+                        help="continue from a checkpoint (default: the newest of the latest run in checkpoints/runs/)")
+    parser.add_argument("--keep-last", type=int, default=3, help="number of most recent epoch checkpoints to keep")
+    parser.add_argument("--keep-best", type=int, default=2, help="number of best-accuracy checkpoints to keep")
+    parser.add_argument("--full-checkpoints", action="store_true",
+                        help="store the whole model in every checkpoint instead of a delta over the frozen base")
+    parser.add_argument("--log-every", type=int, default=10,
+                        help="log stage timings, throughput and memory every this many steps")
+    parser.add_argument("--profile-steps", type=parse_steps, metavar="START:END",
+                        help="record a torch.profiler trace of these global steps into logs/profile")
+    parser.add_argument("--eval-every", type=int, default=None,
+                        help="also evaluate a fixed test subsample every this many steps")
+    parser.add_argument("--eval-subsample", type=int, default=1024, help="size of that subsample")
+    add_run_arguments(parser)
+    args = parser.parse_args()
+    instrumentation = dict(log_every=args.log_every, profile_steps=args.profile_steps,
+                           eval_every=args.eval_every, eval_subsample=args.eval_subsample)
+    checkpointing = dict(resume=args.resume, keep_last=args.keep_last, keep_best=args.keep_best,
+                         full_checkpoints=args.full_checkpoints)
+    if args.replay:
+        run = RunConfig.load(args.replay, 'train')
+        main(seed=run.seed, deterministic=run.deterministic, **run.params, **checkpointing, **instrumentation)
+    else:
+        main(backbone=args.backbone, use_feature_cache=args.feature_cache, batch_augment=args.batch_augment,
+             precision=args.precision, channels_last=args.channels_last, balanced=args.balanced,
+             clip_size=args.clip_size, seed=args.seed, deterministic=args.deterministic,
+             epochs=args.epochs, batch_size=args.batch_size, num_workers=args.num_workers,
+             shard_dirs=args.shard_dirs, **checkpointing, **instrumentation)
\ No newline at end of file
@@ -0,0 +1,147 @@
+# run_config.py
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import platform
+import subprocess
+import numpy as np
+
+# Written next to a run's outputs, e.g. checkpoints/best_model.run.json
+RUN_CONFIG_SUFFIX = '.run.json'
+
+
+def derive_seed(base_seed, *names):
+    """Independent 63-bit seed for one named stream, e.g. derive_seed(0, 'shuffle', 3)
+
+    Hashing (seed, names) instead of adding offsets means streams never
+    overlap and adding a new stream does not shift the existing ones.
+    """
+    digest = hashlib.sha256(repr((int(base_seed),) + tuple(str(n) for n in names)).encode()).digest()
+    return int.from_bytes(digest[:8], 'little') >> 1
+
+
+def seed_everything(seed, deterministic=False):
+    """Seed Python, NumPy and (when installed) torch global RNGs
+
+    deterministic also makes torch pick deterministic kernels, which is
+    slower on GPU but required for bit-identical reruns there.
+    """
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.manual_seed(seed)
+    if deterministic:
+        os.environ.setdefault('CUBLAS_WORKSPACE_CONFIG', ':4096:8')
+        torch.use_deterministic_algorithms(True, warn_only=True)
+        torch.backends.cudnn.deterministic = True
+        torch.backends.cudnn.benchmark = False
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, timeout=5,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment():
+    """Versions that can change results even with identical seeds"""
+    env = {
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'git_commit': _git_commit(),
+    }
+    for module in ('torch', 'torchvision', 'cv2'):
+        try:
+            env[module] = __import__(module).__version__
+        except ImportError:
+            pass
+    return env
+
+
+class RunConfig:
+    """Seed and parameters of one run of a pipeline stage (manifest, extraction, training)
+
+    Every source of randomness asks for its own stream by name
+    (run.seed_for('loader'), run.rng('split'), ...), so the stage is a pure
+    function of this object. Saving it next to the outputs and passing the
+    loaded copy back to the stage replays the run.
+    """
+
+    def __init__(self, stage, seed=0, deterministic=False, **params):
+        self.stage = stage
+        self.seed = int(seed)
+        self.deterministic = deterministic
+        self.params = params
+
+    def seed_for(self, *names):
+        return derive_seed(self.seed, self.stage, *names)
+
+    def rng(self, *names):
+        """random.Random for one named stream"""
+        return random.Random(self.seed_for(*names))
+
+    def np_rng(self, *names):
+        """numpy Generator for one named stream"""
+        return np.random.default_rng(self.seed_for(*names))
+
+    def seed_globals(self):
+        """Seed the global RNGs (model init, anything not given its own stream)"""
+        seed_everything(self.seed_for('global') % 2**32, self.deterministic)
+
+    def to_dict(self):
+        return {
+            'stage': self.stage,
+            'seed': self.seed,
+            'deterministic': self.deterministic,
+            'params': self.params,
+            'environment': environment(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+
+    def save(self, path):
+        """Write the config as JSON (atomically) and return the path"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def from_dict(cls, data, stage=None):
+        if stage is not None and data['stage'] != stage:
+            raise ValueError(f"Run config is for stage {data['stage']!r}, not {stage!r}")
+        return cls(data['stage'], data['seed'], data.get('deterministic', False), **data['params'])
+
+    @classmethod
+    def load(cls, path, stage=None):
+        """Config saved by save(); warns when the code or libraries have changed since"""
+        with open(path, 'r') as f:
+            data = json.load(f)
+        recorded = data.get('environment', {})
+        current = environment()
+        changed = [key for key in ('git_commit', 'torch', 'numpy', 'cv2')
+                   if recorded.get(key) != current.get(key)]
+        if changed:
+            print(f"⚠️  Replaying {path} with different {', '.join(changed)}; results may differ")
+        return cls.from_dict(data, stage)
+
+    def __repr__(self):
+        params = ', '.join(f'{k}={v!r}' for k, v in self.params.items())
+        return f"RunConfig({self.stage!r}, seed={self.seed}, {params})"
+
+
+def add_run_arguments(parser):
+    parser.add_argument("--seed", type=int, default=0, help="base seed every random stream is derived from")
+    parser.add_argument("--replay", metavar="RUN_JSON",
+                        help=f"rerun exactly with the seed and settings of a saved *{RUN_CONFIG_SUFFIX}")
@@ -0,0 +1,165 @@
+# split_engine.py
+import re
+import random
+import collections
+import numpy as np
+
+DEFAULT_RATIOS = {"train": 0.8, "test": 0.2}
+
+# FaceForensics++ manipulations are named "<target>_<source>" after the two original videos
+PAIR_PATTERN = re.compile(r'^(\d+)_(\d+)$')
+# DeepFakeDetection uses paid actors: "01_02__outside_talking__YVGY8LOK" (fake), "01__outside_talking" (real)
+DFD_FAKE_PATTERN = re.compile(r'^(\d+)_\d+__(.+?)__')
+DFD_REAL_PATTERN = re.compile(r'^(\d+)__(.+)$')
+
+# A group holding more than this share of a method's videos cannot be split in the requested ratios
+MAX_GROUP_SHARE = 0.05
+
+
+def parse_identities(method, video_id):
+    """Identities (people) appearing in a video, e.g. ("000", "003") for Deepfakes/000_003
+
+    Videos sharing an identity must land in the same split, otherwise the
+    model is evaluated on faces it was trained on. DeepFakeDetection is the
+    exception: its few actors each appear in many swap pairs, so grouping by
+    actor would chain nearly all of it into one group. There the unit is the
+    source recording (actor and scene), which keeps every fake with the real
+    video it was made from.
+    """
+    if method == "DeepFakeDetection" or method.startswith("DeepFakeDetection_"):
+        match = DFD_FAKE_PATTERN.match(video_id) or DFD_REAL_PATTERN.match(video_id)
+        if match:
+            actor, scene = match.groups()
+            return (f"dfd:{actor}__{scene}",)
+    elif method == "original":
+        return (video_id,)
+    else:
+        match = PAIR_PATTERN.match(video_id)
+        if match:
+            return match.groups()
+    # Unknown naming: the video is its own group
+    return (f"{method}:{video_id}",)
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        parent = self.parent.setdefault(item, item)
+        if parent != item:
+            root = item
+            while self.parent[root] != root:
+                root = self.parent[root]
+            # Path compression keeps later finds O(1)
+            while self.parent[item] != root:
+                self.parent[item], item = root, self.parent[item]
+            return root
+        return item
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            # Smaller root wins so the result does not depend on insertion order
+            if root_b < root_a:
+                root_a, root_b = root_b, root_a
+            self.parent[root_b] = root_a
+
+
+def identity_groups(methods, video_ids):
+    """Group key per video: videos connected through any shared identity share a key"""
+    identities = [parse_identities(method, video_id) for method, video_id in zip(methods, video_ids)]
+    groups = _UnionFind()
+    for ids in identities:
+        for other in ids[1:]:
+            groups.union(ids[0], other)
+    return [groups.find(ids[0]) for ids in identities]
+
+
+def assign_splits(manifest, ratios=None, seed=0, stratify=True):
+    """Split name per manifest row, keeping identity groups together
+
+    Groups are visited in a seeded shuffle of their sorted keys, so the result
+    depends only on the set of videos and the seed, not on scan order. Each
+    group goes to the split furthest below its target share; with stratify
+    that deficit is measured per (method, label), so every manipulation
+    method and the real videos are split in the requested ratios. Runs in
+    linear time in the number of videos.
+    """
+    ratios = dict(ratios or DEFAULT_RATIOS)
+    total_ratio = sum(ratios.values())
+    if total_ratio <= 0 or any(r < 0 for r in ratios.values()):
+        raise ValueError(f"Split ratios must be non-negative and not all zero: {ratios}")
+    names = [name for name in ratios if ratios[name] > 0]
+    shares = np.array([ratios[name] / total_ratio for name in names])
+
+    methods = [m.decode() if isinstance(m, bytes) else m for m in manifest['method']]
+    video_ids = [v.decode() if isinstance(v, bytes) else v for v in manifest['video_id']]
+    labels = np.asarray(manifest['label'])
+    strata = [(m, int(l)) if stratify else 'all' for m, l in zip(methods, labels)]
+
+    members = collections.defaultdict(list)
+    for row, group in enumerate(identity_groups(methods, video_ids)):
+        members[group].append(row)
+    stratum_totals = collections.Counter(strata)
+
+    order = sorted(members)
+    random.Random(seed).shuffle(order)
+
+    assigned = {stratum: np.zeros(len(names)) for stratum in stratum_totals}
+    split_of_row = np.empty(len(labels), dtype=object)
+    for group in order:
+        counts = collections.Counter(strata[row] for row in members[group])
+        # Deficit of each split after adding this group, weighted by how much of each stratum it holds
+        score = np.zeros(len(names))
+        for stratum, count in counts.items():
+            done = assigned[stratum]
+            score += count * (shares * (done.sum() + count) - done) / stratum_totals[stratum]
+        best = int(np.argmax(score))
+        for stratum, count in counts.items():
+            assigned[stratum][best] += count
+        split_of_row[members[group]] = names[best]
+    return split_of_row
+
+
+def oversized_groups(methods, video_ids, max_share=MAX_GROUP_SHARE):
+    """Identity groups holding more than max_share of some method's videos, largest first
+
+    Such a group lands in a single split as a whole, so that method cannot
+    follow the requested ratios.
+    """
+    method_totals = collections.Counter(methods)
+    group_methods = collections.defaultdict(collections.Counter)
+    for method, group in zip(methods, identity_groups(methods, video_ids)):
+        group_methods[group][method] += 1
+    oversized = []
+    for group, counts in group_methods.items():
+        shares = {method: count / method_totals[method] for method, count in counts.items()}
+        if sum(counts.values()) > 1 and max(shares.values()) > max_share:
+            oversized.append({'group': group, 'videos': sum(counts.values()), 'method_shares': shares})
+    return sorted(oversized, key=lambda g: (-g['videos'], g['group']))
+
+
+def split_stats(manifest, split_of_row):
+    """Per-split video counts by method and label, an identity leakage check and oversized groups"""
+    methods = [m.decode() if isinstance(m, bytes) else m for m in manifest['method']]
+    video_ids = [v.decode() if isinstance(v, bytes) else v for v in manifest['video_id']]
+    labels = np.asarray(manifest['label'])
+
+    stats = {}
+    identity_splits = collections.defaultdict(set)
+    for method, video_id, label, split in zip(methods, video_ids, labels, split_of_row):
+        entry = stats.setdefault(split, {'videos': 0, 'real': 0, 'fake': 0, 'methods': collections.Counter()})
+        entry['videos'] += 1
+        entry['real' if label == 0 else 'fake'] += 1
+        entry['methods'][method] += 1
+        for identity in parse_identities(method, video_id):
+            identity_splits[identity].add(split)
+
+    leaked = sorted(identity for identity, splits in identity_splits.items() if len(splits) > 1)
+    return {
+        'splits': {split: dict(entry, methods=dict(entry['methods'])) for split, entry in stats.items()},
+        'identities': len(identity_splits),
+        'leaked_identities': leaked,
+        'oversized_groups': oversized_groups(methods, video_ids),
+    }